@@ -186,7 +186,7 @@ def login():
         
         # Find user
         with db_manager.get_session() as session:
-            user = session.query(User).filter_by(email=email).first()
+            user = User.get_by_email(session, email)
             
             if not user or not check_password_hash(user.password_hash, password):
                 # Log failed login attempt
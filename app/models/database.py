@@ -12,6 +12,10 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from werkzeug.security import generate_password_hash
+from .user_common import (
+    ROLE_LEVEL, ANALYST_OR_HIGHER, VIEWER_OR_HIGHER, USER_DATETIME_FIELDS, iso,
+    create_default_users as _create_default_users
+)
 
 Base = declarative_base()
 
@@ -34,7 +38,7 @@ class User(Base, TimestampMixin):
     
     # User identification
     name = Column(String(100), nullable=False)
-    email = Column(String(120), unique=True, nullable=False, index=True)
+    email = Column(String(120), nullable=False)  # Case-insensitive uniqueness via ix_users_email_lower
     password_hash = Column(String(255), nullable=False)
     
     # Role-based access control
@@ -58,7 +62,7 @@ class User(Base, TimestampMixin):
     
     # Indexes
     __table_args__ = (
-        Index('idx_users_email', 'email'),
+        Index('ix_users_email_lower', func.lower(email), unique=True),
         Index('idx_users_role', 'role'),
         Index('idx_users_is_active', 'is_active'),
         Index('idx_users_created_at', 'created_at'),
@@ -79,8 +83,11 @@ class User(Base, TimestampMixin):
     def __repr__(self):
         return f'<User {self.email} ({self.role})>'
     
-    def to_dict(self, include_sensitive=False):
-        """Convert user to dictionary representation."""
+    def to_dict_raw(self, include_sensitive=False):
+        """Convert user to dictionary, leaving datetime fields as datetime objects.
+        
+        Intended for serializers that encode datetimes natively (e.g. orjson).
+        """
         data = {
             'id': self.id,
             'name': self.name,
@@ -88,9 +95,9 @@ class User(Base, TimestampMixin):
             'role': self.role,
             'is_active': self.is_active,
             'is_verified': self.is_verified,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'last_login_at': self.last_login_at.isoformat() if self.last_login_at else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'last_login_at': self.last_login_at,
             'login_count': self.login_count or 0,
             'phone': self.phone,
             'department': self.department,
@@ -99,12 +106,20 @@ class User(Base, TimestampMixin):
         
         if include_sensitive:
             data.update({
-                'password_changed_at': self.password_changed_at.isoformat() if self.password_changed_at else None,
+                'password_changed_at': self.password_changed_at,
                 'notes': self.notes
             })
         
         return data
     
+    def to_dict(self, include_sensitive=False):
+        """Convert user to dictionary representation."""
+        data = self.to_dict_raw(include_sensitive)
+        for field in USER_DATETIME_FIELDS:
+            if field in data:
+                data[field] = iso(data[field])
+        return data
+    
     @property
     def is_admin(self):
         """Check if user has admin role."""
@@ -113,25 +128,16 @@ class User(Base, TimestampMixin):
     @property
     def is_analyst(self):
         """Check if user has analyst role or higher."""
-        return self.role in ['admin', 'analyst']
+        return self.role in ANALYST_OR_HIGHER
     
     @property
     def is_viewer(self):
         """Check if user has at least viewer role."""
-        return self.role in ['admin', 'analyst', 'viewer']
+        return self.role in VIEWER_OR_HIGHER
     
     def has_permission(self, required_role):
         """Check if user has required role permission."""
-        role_hierarchy = {
-            'viewer': 1,
-            'analyst': 2,
-            'admin': 3
-        }
-        
-        user_level = role_hierarchy.get(self.role, 0)
-        required_level = role_hierarchy.get(required_role, 0)
-        
-        return user_level >= required_level
+        return ROLE_LEVEL.get(self.role, 0) >= ROLE_LEVEL.get(required_role, 0)
     
     def update_last_login(self):
         """Update last login timestamp and increment login count."""
@@ -140,80 +146,13 @@ class User(Base, TimestampMixin):
     
     @classmethod
     def create_default_users(cls, db_session):
-        """Create default users for demo/development."""
-        default_users = [
-            {
-                'name': 'System Administrator',
-                'email': 'admin@fraudnet.ai',
-                'password': 'admin123',
-                'role': 'admin',
-                'is_verified': True,
-                'department': 'IT Security'
-            },
-            {
-                'name': 'Fraud Analyst',
-                'email': 'analyst@fraudnet.ai',
-                'password': 'analyst123',
-                'role': 'analyst',
-                'is_verified': True,
-                'department': 'Risk Management'
-            },
-            {
-                'name': 'Dashboard Viewer',
-                'email': 'viewer@fraudnet.ai',
-                'password': 'viewer123',
-                'role': 'viewer',
-                'is_verified': True,
-                'department': 'Operations'
-            },
-            {
-                'name': 'John Smith',
-                'email': 'john.smith@fraudnet.ai',
-                'password': 'demo123',
-                'role': 'analyst',
-                'is_verified': True,
-                'department': 'Fraud Investigation',
-                'phone': '+1-555-0123'
-            },
-            {
-                'name': 'Sarah Johnson',
-                'email': 'sarah.johnson@fraudnet.ai',
-                'password': 'demo123',
-                'role': 'viewer',
-                'is_verified': True,
-                'department': 'Customer Service',
-                'phone': '+1-555-0124'
-            }
-        ]
-        
-        created_users = []
-        
-        try:
-            for user_data in default_users:
-                # Check if user already exists
-                existing_user = db_session.query(cls).filter_by(email=user_data['email']).first()
-                
-                if not existing_user:
-                    user = cls(**user_data)
-                    db_session.add(user)
-                    created_users.append(user.email)
-            
-            db_session.commit()
-            
-            if created_users:
-                print(f"Created default users: {', '.join(created_users)}")
-            else:
-                print("Default users already exist")
-                
-        except Exception as e:
-            db_session.rollback()
-            print(f"Error creating default users: {str(e)}")
-            raise
+        """Create missing default users for demo/development; returns how many were inserted."""
+        return _create_default_users(cls, db_session)
     
     @classmethod
     def get_by_email(cls, db_session, email):
         """Get user by email address."""
-        return db_session.query(cls).filter_by(email=email.lower()).first()
+        return db_session.query(cls).filter(func.lower(cls.email) == email.lower()).first()
     
     @classmethod
     def get_active_users(cls, db_session):
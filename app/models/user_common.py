@@ -0,0 +1,131 @@
+"""Role constants and default-user seeding shared by the User models."""
+
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.sql import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from werkzeug.security import generate_password_hash
+
+# Role hierarchy used for permission checks (higher level = more privileges)
+ROLE_LEVEL = {
+    'viewer': 1,
+    'analyst': 2,
+    'admin': 3
+}
+ANALYST_OR_HIGHER = frozenset({'admin', 'analyst'})
+VIEWER_OR_HIGHER = frozenset({'admin', 'analyst', 'viewer'})
+
+USER_DATETIME_FIELDS = ('created_at', 'updated_at', 'last_login_at', 'password_changed_at')
+
+# Default users for demo/development
+DEFAULT_USERS = [
+    {
+        'name': 'System Administrator',
+        'email': 'admin@fraudnet.ai',
+        'password': 'admin123',
+        'role': 'admin',
+        'is_verified': True,
+        'department': 'IT Security'
+    },
+    {
+        'name': 'Fraud Analyst',
+        'email': 'analyst@fraudnet.ai',
+        'password': 'analyst123',
+        'role': 'analyst',
+        'is_verified': True,
+        'department': 'Risk Management'
+    },
+    {
+        'name': 'Dashboard Viewer',
+        'email': 'viewer@fraudnet.ai',
+        'password': 'viewer123',
+        'role': 'viewer',
+        'is_verified': True,
+        'department': 'Operations'
+    },
+    {
+        'name': 'John Smith',
+        'email': 'john.smith@fraudnet.ai',
+        'password': 'demo123',
+        'role': 'analyst',
+        'is_verified': True,
+        'department': 'Fraud Investigation',
+        'phone': '+1-555-0123'
+    },
+    {
+        'name': 'Sarah Johnson',
+        'email': 'sarah.johnson@fraudnet.ai',
+        'password': 'demo123',
+        'role': 'viewer',
+        'is_verified': True,
+        'department': 'Customer Service',
+        'phone': '+1-555-0124'
+    }
+]
+
+def iso(dt):
+    """Format an optional datetime as an ISO 8601 string."""
+    return dt.isoformat() if dt else None
+
+def insert_ignore(table, dialect_name):
+    """Build an INSERT that silently skips rows violating a unique index, if the dialect supports it."""
+    if dialect_name == 'postgresql':
+        return pg_insert(table).on_conflict_do_nothing()
+    if dialect_name == 'sqlite':
+        return sqlite_insert(table).on_conflict_do_nothing()
+    if dialect_name in ('mysql', 'mariadb'):
+        return mysql_insert(table).prefix_with('IGNORE')
+    return None
+
+def create_default_users(model, db_session):
+    """Insert the missing DEFAULT_USERS through a User model; returns how many were inserted."""
+    try:
+        # Only users that don't exist yet need their passwords hashed
+        existing = {
+            email for (email,) in db_session.query(func.lower(model.email)).filter(
+                func.lower(model.email).in_([u['email'].lower() for u in DEFAULT_USERS])
+            )
+        }
+        default_users = [u for u in DEFAULT_USERS if u['email'].lower() not in existing]
+        
+        # Password hashing is CPU-bound; hash the missing users concurrently
+        password_hashes = []
+        if default_users:
+            with ThreadPoolExecutor(max_workers=len(default_users)) as executor:
+                password_hashes = list(executor.map(
+                    generate_password_hash, [u['password'] for u in default_users]
+                ))
+        
+        rows = [
+            {
+                'name': user_data['name'],
+                'email': user_data['email'].lower(),
+                'password_hash': password_hash,
+                'role': user_data['role'],
+                'is_verified': user_data.get('is_verified', False),
+                'department': user_data.get('department'),
+                'phone': user_data.get('phone')
+            }
+            for user_data, password_hash in zip(default_users, password_hashes)
+        ]
+        
+        # INSERT ... ON CONFLICT DO NOTHING / INSERT IGNORE also skips users created concurrently
+        stmt = insert_ignore(model.__table__, db_session.get_bind().dialect.name)
+        if stmt is None:
+            stmt = model.__table__.insert()
+        
+        created_count = db_session.execute(stmt.values(rows)).rowcount if rows else 0
+        db_session.commit()
+        
+        if created_count:
+            print(f"Created {created_count} default users")
+        else:
+            print("Default users already exist")
+        
+        return created_count
+        
+    except Exception as e:
+        db_session.rollback()
+        print(f"Error creating default users: {str(e)}")
+        raise
@@ -11,6 +11,7 @@ from sklearn.compose import ColumnTransformer
 import joblib
 import json
 import hashlib
+import pickle
 from contextlib import contextmanager
 
 from app.utils.helpers import (
@@ -51,6 +52,7 @@ class FeatureConfig:
     ]
     
     ALL_FEATURES = TRANSACTION_FEATURES + USER_FEATURES + DEVICE_FEATURES + LOCATION_FEATURES
+    ALL_FEATURES_SET = frozenset(ALL_FEATURES)
 
 class HistoricalFeatureExtractor:
     """Extract historical features for training data."""
@@ -252,6 +254,8 @@ class RealTimeFeatureExtractor:
 class FeatureEngineeringPipeline:
     """Complete feature engineering pipeline ensuring training-inference parity."""
     
+    _schema_hash: Optional[str] = None
+    
     def __init__(self, db_session: Session):
         self.db_session = db_session
         self.historical_extractor = HistoricalFeatureExtractor(db_session)
@@ -372,7 +376,7 @@ class FeatureEngineeringPipeline:
     
     def fit_preprocessing_pipeline(self, training_features: pd.DataFrame) -> None:
         """Fit the preprocessing pipeline on training data."""
-        feature_columns = [col for col in training_features.columns if col in self.config.ALL_FEATURES]
+        feature_columns = [col for col in training_features.columns if col in self.config.ALL_FEATURES_SET]
         X = training_features[feature_columns]
         
         self.preprocessing_pipeline.fit(X)
@@ -385,7 +389,7 @@ class FeatureEngineeringPipeline:
             'feature_config': self.config.__dict__,
             'version': self.config.VERSION
         }
-        joblib.dump(pipeline_data, filepath)
+        joblib.dump(pipeline_data, filepath, compress=0, protocol=pickle.HIGHEST_PROTOCOL)
         self.logger.info(f"Feature pipeline saved to {filepath}")
     
     def load_pipeline(self, filepath: str) -> None:
@@ -401,8 +405,17 @@ class FeatureEngineeringPipeline:
     
     def get_feature_schema_hash(self) -> str:
         """Get hash of current feature schema for version tracking."""
-        schema_data = {
-            'version': self.config.VERSION,
-            'features': sorted(self.config.ALL_FEATURES)
-        }
-        return hashlib.md5(json.dumps(schema_data, sort_keys=True).encode()).hexdigest()
\ No newline at end of file
+        # The schema only depends on FeatureConfig constants, so compute it once per process
+        cls = type(self)
+        if cls._schema_hash is None:
+            schema_data = {
+                'version': self.config.VERSION,
+                'features': sorted(self.config.ALL_FEATURES)
+            }
+            cls._schema_hash = hashlib.md5(json.dumps(schema_data, sort_keys=True).encode()).hexdigest()
+        return cls._schema_hash
+    
+    @classmethod
+    def invalidate_schema_cache(cls) -> None:
+        """Drop the cached schema hash, e.g. after editing FeatureConfig in development."""
+        cls._schema_hash = None
\ No newline at end of file
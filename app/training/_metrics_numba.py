@@ -0,0 +1,44 @@
+"""Confusion-matrix kernels for training metrics."""
+
+import numpy as np
+from typing import Tuple
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; fall back to numpy
+    njit = None
+
+if njit is not None:
+    # No cache=True: numba's on-disk cache writes next to the source, which may be read-only
+    @njit(parallel=True)
+    def _confusion_counts(y_true, y_score, threshold):
+        """Threshold scores and accumulate TN/FP/FN/TP in a single parallel pass."""
+        tn = 0
+        fp = 0
+        fn = 0
+        tp = 0
+        for i in prange(y_true.shape[0]):
+            predicted = y_score[i] > threshold
+            if y_true[i] != 0:
+                tp += 1 if predicted else 0
+                fn += 0 if predicted else 1
+            else:
+                fp += 1 if predicted else 0
+                tn += 0 if predicted else 1
+        return tn, fp, fn, tp
+else:
+    def _confusion_counts(y_true, y_score, threshold):
+        """Threshold scores and derive TN/FP/FN/TP from two boolean masks."""
+        predicted = y_score > threshold
+        actual = y_true != 0
+        tp = np.count_nonzero(actual & predicted)
+        fn = np.count_nonzero(actual) - tp
+        fp = np.count_nonzero(predicted) - tp
+        tn = y_true.shape[0] - tp - fn - fp
+        return tn, fp, fn, tp
+
+def confusion_counts(y_true, y_score, threshold: float = 0.5) -> Tuple[int, int, int, int]:
+    """Return (tn, fp, fn, tp) for binary labels and scores thresholded with '>'."""
+    y_true = np.ascontiguousarray(y_true, dtype=np.int8)
+    y_score = np.ascontiguousarray(y_score, dtype=np.float64)
+    return tuple(int(c) for c in _confusion_counts(y_true, y_score, float(threshold)))
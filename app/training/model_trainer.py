@@ -7,11 +7,20 @@ import json
 import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Tuple, Optional, Union
+
+try:
+    # Route supported estimators through oneDAL when the Intel extension is installed
+    from sklearnex import patch_sklearn
+    patch_sklearn(verbose=False)
+except ImportError:  # scikit-learn-intelex is optional; stock scikit-learn is used
+    pass
+
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import (
-    train_test_split, GridSearchCV, StratifiedKFold, cross_val_score
+    train_test_split, GridSearchCV, RandomizedSearchCV, StratifiedKFold, cross_val_score
 )
+from scipy.stats import loguniform, randint, uniform
 from sklearn.metrics import (
     roc_auc_score, precision_score, recall_score, f1_score, 
     confusion_matrix, classification_report, roc_curve, precision_recall_curve
@@ -21,21 +30,35 @@ from sklearn.preprocessing import StandardScaler
 import matplotlib.pyplot as plt
 import os
 
+try:
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+except ImportError:  # skl2onnx is optional; models are only saved with joblib
+    convert_sklearn = None
+
 from app.utils.logging import get_logger, ModelLogger
 from app.utils.helpers import generate_model_version, generate_hash, measure_execution_time
 from app.preprocessing.feature_engineering import FeatureEngineeringPipeline, FeatureConfig
 from app.validation.feature_validation import FeatureValidator
 from app.models.database import Transaction, Prediction, ModelRegistry
 from app.utils.database import DatabaseManager
+from app.training._metrics_numba import confusion_counts
 
 logger = get_logger(__name__)
 
 class ModelTrainer:
     """Comprehensive model training pipeline."""
     
-    def __init__(self, db_manager: DatabaseManager, artifacts_path: str):
+    def __init__(self, db_manager: DatabaseManager, artifacts_path: str,
+                 search_strategy: Optional[str] = None, n_iter: int = 20,
+                 compress_artifacts: bool = False):
         self.db_manager = db_manager
         self.artifacts_path = artifacts_path
+        self.search_strategy = search_strategy  # None uses each model's default
+        self.n_iter = n_iter
+        self.compress_artifacts = compress_artifacts
+        self.cv_folds = 5
+        self._cv_splitter = StratifiedKFold(n_splits=self.cv_folds, shuffle=True, random_state=42)
         self.models_path = os.path.join(artifacts_path, 'models')
         self.metrics_path = os.path.join(artifacts_path, 'metrics')
         self.preprocessing_path = os.path.join(artifacts_path, 'preprocessing')
@@ -55,6 +78,12 @@ class ModelTrainer:
                     'C': [0.1, 1.0, 10.0],
                     'penalty': ['l1', 'l2'],
                     'solver': ['liblinear', 'lbfgs']
+                },
+                'search_strategy': 'grid',
+                'param_distributions': {
+                    'C': loguniform(1e-3, 1e2),
+                    'penalty': ['l1', 'l2'],
+                    'solver': ['liblinear']
                 }
             },
             'random_forest': {
@@ -64,6 +93,13 @@ class ModelTrainer:
                     'max_depth': [5, 10, None],
                     'min_samples_split': [2, 5, 10],
                     'min_samples_leaf': [1, 2, 4]
+                },
+                'search_strategy': 'random',
+                'param_distributions': {
+                    'n_estimators': randint(50, 500),
+                    'max_depth': [5, 10, 20, None],
+                    'min_samples_split': randint(2, 11),
+                    'min_samples_leaf': randint(1, 5)
                 }
             },
             'gradient_boosting': {
@@ -73,6 +109,13 @@ class ModelTrainer:
                     'learning_rate': [0.05, 0.1, 0.15],
                     'max_depth': [3, 4, 5],
                     'subsample': [0.8, 0.9, 1.0]
+                },
+                'search_strategy': 'random',
+                'param_distributions': {
+                    'n_estimators': randint(50, 300),
+                    'learning_rate': loguniform(0.01, 0.3),
+                    'max_depth': randint(2, 6),
+                    'subsample': uniform(0.7, 0.3)
                 }
             }
         }
@@ -149,7 +192,15 @@ class ModelTrainer:
         # Get model configuration
         model_config = self.model_configs[model_type]
         base_model = model_config['model']
-        param_grid = hyperparameters or model_config['params']
+        search_strategy = self.search_strategy or model_config['search_strategy']
+        if hyperparameters:
+            # Explicit hyperparameters are always searched exhaustively
+            search_strategy = 'grid'
+            param_grid = hyperparameters
+        elif search_strategy == 'random':
+            param_grid = model_config['param_distributions']
+        else:
+            param_grid = model_config['params']
         
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
@@ -158,6 +209,9 @@ class ModelTrainer:
         
         self.logger.info(f"Training set: {X_train.shape}, Test set: {X_test.shape}")
         
+        # Materialize the CV folds once; the search and cross-validation share them
+        cv_splits = list(self._cv_splitter.split(X_train, y_train))
+        
         # Create preprocessing pipeline
         feature_pipeline = FeatureEngineeringPipeline(None)  # No DB session needed for just preprocessing
         feature_pipeline.fit_preprocessing_pipeline(X_train)
@@ -168,21 +222,35 @@ class ModelTrainer:
             ('classifier', base_model)
         ])
         
-        # Hyperparameter tuning with grid search
+        # Hyperparameter tuning with grid or randomized search
         if len(param_grid) > 0:
             # Add 'classifier__' prefix to parameter names for pipeline
             pipeline_param_grid = {f'classifier__{k}': v for k, v in param_grid.items()}
             
-            cv_strategy = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-            
-            grid_search = GridSearchCV(
-                pipeline,
-                pipeline_param_grid,
-                cv=cv_strategy,
-                scoring='roc_auc',
-                n_jobs=-1,
-                verbose=0
-            )
+            if search_strategy == 'random':
+                grid_search = RandomizedSearchCV(
+                    pipeline,
+                    param_distributions=pipeline_param_grid,
+                    n_iter=self.n_iter,
+                    cv=cv_splits,
+                    scoring='roc_auc',
+                    n_jobs=-1,
+                    pre_dispatch='2*n_jobs',
+                    refit=True,
+                    random_state=42,
+                    verbose=0
+                )
+            else:
+                grid_search = GridSearchCV(
+                    pipeline,
+                    pipeline_param_grid,
+                    cv=cv_splits,
+                    scoring='roc_auc',
+                    n_jobs=-1,
+                    pre_dispatch='2*n_jobs',
+                    refit=True,
+                    verbose=0
+                )
             
             grid_search.fit(X_train, y_train)
             best_model = grid_search.best_estimator_
@@ -208,8 +276,9 @@ class ModelTrainer:
         if use_cross_validation:
             cv_scores = cross_val_score(
                 best_model, X_train, y_train, 
-                cv=StratifiedKFold(n_splits=5, shuffle=True, random_state=42),
-                scoring='roc_auc'
+                cv=cv_splits,
+                scoring='roc_auc',
+                n_jobs=-1
             )
             metrics['cv_auc_mean'] = float(np.mean(cv_scores))
             metrics['cv_auc_std'] = float(np.std(cv_scores))
@@ -223,7 +292,8 @@ class ModelTrainer:
         preprocessing_path = os.path.join(self.preprocessing_path, preprocessing_filename)
         
         # Save model and preprocessing pipeline
-        joblib.dump(best_model, model_path)
+        self._dump_artifact(best_model, model_path)
+        self._export_onnx(best_model, model_path, X.shape[1])
         feature_pipeline.save_pipeline(preprocessing_path)
         
         # Save metrics
@@ -290,14 +360,55 @@ class ModelTrainer:
         
         return results
     
+    def _dump_artifact(self, obj: Any, path: str) -> None:
+        """Persist an artifact with pickle protocol 5, lz4-compressed when enabled."""
+        if not self.compress_artifacts:
+            # Uncompressed artifacts can be memory-mapped at inference time
+            joblib.dump(obj, path, compress=0, protocol=5)
+            return
+        
+        try:
+            joblib.dump(obj, path, compress=('lz4', 1), protocol=5)
+        except ValueError:
+            # lz4 is not installed
+            joblib.dump(obj, path, compress=3, protocol=5)
+    
+    def _export_onnx(self, model: Any, model_path: str, n_features: int) -> Optional[str]:
+        """Write an ONNX export next to the joblib model for the inference fast path."""
+        if convert_sklearn is None:
+            return None
+        
+        onnx_path = os.path.splitext(model_path)[0] + '.onnx'
+        
+        try:
+            classifier = model.steps[-1][1] if isinstance(model, Pipeline) else model
+            onnx_model = convert_sklearn(
+                model,
+                initial_types=[('input', FloatTensorType([None, n_features]))],
+                options={id(classifier): {'zipmap': False}}  # Plain probability tensor output
+            )
+            with open(onnx_path, 'wb') as f:
+                f.write(onnx_model.SerializeToString())
+        except Exception as e:
+            self.logger.warning(f"ONNX export failed for {model_path}: {e}")
+            return None
+        
+        self.logger.info(f"ONNX model exported to {onnx_path}")
+        return onnx_path
+    
     def _calculate_metrics(self, y_train: pd.Series, train_pred: np.ndarray,
                           y_test: pd.Series, test_pred: np.ndarray,
                           threshold: float = 0.5) -> Dict[str, float]:
         """Calculate comprehensive evaluation metrics."""
         
-        # Binary predictions
-        train_pred_binary = (train_pred > threshold).astype(int)
-        test_pred_binary = (test_pred > threshold).astype(int)
+        # Work on raw arrays so the scorers skip pandas index handling
+        y_train = np.ascontiguousarray(y_train, dtype=np.int8)
+        y_test = np.ascontiguousarray(y_test, dtype=np.int8)
+        train_pred = np.ascontiguousarray(train_pred, dtype=np.float64)
+        test_pred = np.ascontiguousarray(test_pred, dtype=np.float64)
+        
+        # One confusion matrix pass; the threshold metrics are derived from its counts
+        tn, fp, fn, tp = confusion_counts(y_test, test_pred, threshold)
         
         metrics = {
             # AUC scores
@@ -305,22 +416,20 @@ class ModelTrainer:
             'test_auc': float(roc_auc_score(y_test, test_pred)),
             
             # Precision, Recall, F1 for test set
-            'test_precision': float(precision_score(y_test, test_pred_binary)),
-            'test_recall': float(recall_score(y_test, test_pred_binary)),
-            'test_f1': float(f1_score(y_test, test_pred_binary)),
+            'test_precision': float(tp / (tp + fp)) if (tp + fp) > 0 else 0.0,
+            'test_recall': float(tp / (tp + fn)) if (tp + fn) > 0 else 0.0,
+            'test_f1': float(2 * tp / (2 * tp + fp + fn)) if tp > 0 else 0.0,
             
             # Confusion matrix for test set
-            'test_true_negatives': int(confusion_matrix(y_test, test_pred_binary)[0, 0]),
-            'test_false_positives': int(confusion_matrix(y_test, test_pred_binary)[0, 1]),
-            'test_false_negatives': int(confusion_matrix(y_test, test_pred_binary)[1, 0]),
-            'test_true_positives': int(confusion_matrix(y_test, test_pred_binary)[1, 1]),
+            'test_true_negatives': tn,
+            'test_false_positives': fp,
+            'test_false_negatives': fn,
+            'test_true_positives': tp,
+            
+            # Specificity
+            'test_specificity': float(tn / (tn + fp)) if (tn + fp) > 0 else 0.0
         }
         
-        # Calculate specificity
-        tn = metrics['test_true_negatives']
-        fp = metrics['test_false_positives']
-        metrics['test_specificity'] = float(tn / (tn + fp)) if (tn + fp) > 0 else 0.0
-        
         return metrics
     
     def _save_to_model_registry(self, model_type: str, model_version: str,
@@ -425,13 +534,18 @@ class ModelEvaluator:
             }
             comparison['models'].append(model_summary)
         
-        # Rank models by different metrics
+        # Rank models by different metrics from one shared frame; stable sorts keep ties in input order
+        models_df = pd.DataFrame.from_records(comparison['models'])
+        ranking_columns = {
+            'by_auc': ('test_auc', False),
+            'by_precision': ('test_precision', False),
+            'by_recall': ('test_recall', False),
+            'by_f1': ('test_f1', False),
+            'by_speed': ('training_duration', True)
+        }
         comparison['rankings'] = {
-            'by_auc': sorted(comparison['models'], key=lambda x: x['test_auc'], reverse=True),
-            'by_precision': sorted(comparison['models'], key=lambda x: x['test_precision'], reverse=True),
-            'by_recall': sorted(comparison['models'], key=lambda x: x['test_recall'], reverse=True),
-            'by_f1': sorted(comparison['models'], key=lambda x: x['test_f1'], reverse=True),
-            'by_speed': sorted(comparison['models'], key=lambda x: x['training_duration'])
+            name: models_df.sort_values(column, ascending=ascending, kind='stable').to_dict('records')
+            for name, (column, ascending) in ranking_columns.items()
         }
         
         # Generate recommendations
@@ -444,8 +558,7 @@ class ModelEvaluator:
         ]
         
         # Check for significant performance differences
-        auc_values = [m['test_auc'] for m in comparison['models']]
-        auc_std = np.std(auc_values)
+        auc_std = models_df['test_auc'].std(ddof=0)
         
         if auc_std < 0.02:  # Low variance in performance
             comparison['recommendations'].append(
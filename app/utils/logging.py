@@ -24,22 +24,28 @@ def setup_logging(log_level: str = "INFO", log_format: str = "json") -> None:
         cache_logger_on_first_use=True,
     )
     
-    # Configure standard logging
+    # Configure standard logging (third-party libraries, app.logger) on its own
+    # stream so it never interleaves with structlog's stdout output
     logging.basicConfig(
         level=getattr(logging, log_level.upper()),
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[logging.StreamHandler(sys.stdout)]
+        handlers=[logging.StreamHandler(sys.stderr)]
     )
 
 def get_logger(name: str) -> structlog.BoundLogger:
     """Get a structured logger instance."""
     return structlog.get_logger(name)
 
+# Shared by all RequestLogger/ModelLogger instances; structlog resolves the
+# configured logger lazily on first use, so this is safe before setup_logging().
+_utility_logger = get_logger(__name__)
+
 class RequestLogger:
     """Request/response logging utility."""
     
-    def __init__(self):
-        self.logger = get_logger(__name__)
+    __slots__ = ()
+    
+    logger = _utility_logger
     
     def log_request(self, request_id: str, method: str, path: str, 
                    payload: Dict[str, Any] = None, user_id: int = None) -> None:
@@ -81,8 +87,9 @@ class RequestLogger:
 class ModelLogger:
     """Model training and inference logging utility."""
     
-    def __init__(self):
-        self.logger = get_logger(__name__)
+    __slots__ = ()
+    
+    logger = _utility_logger
     
     def log_training_start(self, model_type: str, training_data_size: int,
                           hyperparameters: Dict[str, Any] = None) -> None:
@@ -2,18 +2,63 @@
 
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Optional
 from datetime import datetime
+from dataclasses import dataclass
 import json
 
 from app.utils.logging import get_logger
 from app.preprocessing.feature_engineering import FeatureEngineeringPipeline
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; fall back to numpy
+    njit = None
+
 logger = get_logger(__name__)
 
+if njit is not None:
+    # No cache=True: numba's on-disk cache writes next to the source, which may be read-only
+    @njit(parallel=True)
+    def _rows_differ(a, b, atol, rtol):
+        """Per-row mismatch mask with np.isclose semantics, exiting each row at its first diff."""
+        n_rows, n_cols = a.shape
+        mask = np.zeros(n_rows, dtype=np.bool_)
+        for i in prange(n_rows):
+            for j in range(n_cols):
+                x = a[i, j]
+                y = b[i, j]
+                # Equal values, including same-signed infinities, match outright
+                if x == y:
+                    continue
+                # Any other infinity or NaN is a mismatch; finite values get the tolerance
+                if not (np.isfinite(x) and np.isfinite(y)) or abs(x - y) > atol + rtol * abs(y):
+                    mask[i] = True
+                    break
+        return mask
+else:
+    def _rows_differ(a, b, atol, rtol):
+        """Per-row mismatch mask with np.isclose semantics."""
+        return ~np.all(np.isclose(a, b, atol=atol, rtol=rtol), axis=1)
+
+@dataclass(slots=True)
+class _MockTx:
+    """Lightweight stand-in for a Transaction row used in parity checks."""
+    id: int
+    user_id: int
+    amount: float
+    currency: str
+    merchant_category: str
+    device_id: Optional[str]
+    ip_address: Optional[str]
+    timestamp: Any
+    raw_payload: dict
+
 class FeatureValidator:
     """Validates feature engineering pipeline for training-inference parity."""
     
+    __slots__ = ('feature_pipeline', 'logger')
+    
     def __init__(self, feature_pipeline: FeatureEngineeringPipeline):
         self.feature_pipeline = feature_pipeline
         self.logger = get_logger(__name__)
@@ -29,23 +74,11 @@ class FeatureValidator:
         
         inconsistencies = []
         
+        # Build mock transactions, keyed by sample index so rows can be re-aligned
+        mock_transactions = []
         for i, transaction_data in enumerate(sample_data):
             try:
-                # Extract features using training mode (from transaction object simulation)
-                training_features = self._simulate_training_feature_extraction(transaction_data)
-                
-                # Extract features using inference mode
-                inference_features = self.feature_pipeline.extract_features_for_inference(transaction_data)
-                
-                # Compare features
-                if not self._compare_feature_vectors(training_features, inference_features):
-                    inconsistencies.append({
-                        'transaction_index': i,
-                        'training_features': training_features.tolist(),
-                        'inference_features': inference_features.tolist(),
-                        'transaction_data': transaction_data
-                    })
-                    
+                mock_transactions.append(self._build_mock_transaction(i, transaction_data))
             except Exception as e:
                 self.logger.error(f"Error validating transaction {i}: {e}")
                 inconsistencies.append({
@@ -54,7 +87,37 @@ class FeatureValidator:
                     'transaction_data': transaction_data
                 })
         
-        success_rate = (sample_size - len(inconsistencies)) / sample_size
+        # Extract features using training mode in a single pipeline call
+        row_indices, training_matrix = self._simulate_training_feature_extraction(mock_transactions)
+        
+        extracted = set(row_indices.tolist())
+        for transaction in mock_transactions:
+            if transaction.id not in extracted:
+                inconsistencies.append({
+                    'transaction_index': transaction.id,
+                    'error': 'Training feature extraction failed',
+                    'transaction_data': sample_data[transaction.id]
+                })
+        
+        if len(row_indices) > 0:
+            # Extract features using inference mode
+            inference_matrix = np.vstack([
+                np.ravel(self.feature_pipeline.extract_features_for_inference(sample_data[i]))
+                for i in row_indices
+            ])
+            
+            # Compare features row-wise and report only the mismatches
+            bad_idx = np.where(self._find_inconsistent_rows(training_matrix, inference_matrix))[0]
+            for k in bad_idx:
+                inconsistencies.append({
+                    'transaction_index': int(row_indices[k]),
+                    'training_features': training_matrix[k].tolist(),
+                    'inference_features': inference_matrix[k].tolist(),
+                    'transaction_data': sample_data[row_indices[k]]
+                })
+        
+        sample_size = len(sample_data)
+        success_rate = (sample_size - len(inconsistencies)) / sample_size if sample_size else 1.0
         
         if inconsistencies:
             self.logger.warning(f"Found {len(inconsistencies)} inconsistencies out of {sample_size} samples")
@@ -68,13 +131,10 @@ class FeatureValidator:
         
         return len(inconsistencies) == 0
     
-    def _simulate_training_feature_extraction(self, transaction_data: Dict[str, Any]) -> np.ndarray:
-        """Simulate feature extraction as it would happen during training."""
-        # Create a mock transaction object
-        from app.models.database import Transaction
-        
-        mock_transaction = Transaction(
-            id=transaction_data.get('id', 1),
+    def _build_mock_transaction(self, index: int, transaction_data: Dict[str, Any]) -> _MockTx:
+        """Build a mock transaction object whose id is the sample index."""
+        return _MockTx(
+            id=index,
             user_id=transaction_data['user_id'],
             amount=transaction_data['amount'],
             currency=transaction_data['currency'],
@@ -84,21 +144,37 @@ class FeatureValidator:
             timestamp=transaction_data['timestamp'],
             raw_payload=transaction_data.get('raw_payload', {})
         )
+    
+    def _simulate_training_feature_extraction(self, mock_transactions: List[_MockTx]) -> Tuple[np.ndarray, np.ndarray]:
+        """Simulate feature extraction as it would happen during training.
+        
+        Returns the sample indices that were extracted successfully and the
+        matching feature matrix (one row per index, transaction_id excluded).
+        """
+        n_features = len(self.feature_pipeline.config.ALL_FEATURES)
+        if not mock_transactions:
+            return np.empty(0, dtype=np.intp), np.empty((0, n_features))
         
         # Extract features as if it's for training
-        features_df = self.feature_pipeline.extract_features_for_training([mock_transaction])
+        features_df = self.feature_pipeline.extract_features_for_training(mock_transactions)
+        if features_df.empty:
+            return np.empty(0, dtype=np.intp), np.empty((0, n_features))
         
-        # Get feature vector (exclude transaction_id)
         feature_columns = [col for col in features_df.columns if col != 'transaction_id']
-        return features_df[feature_columns].values[0]
+        row_indices = features_df['transaction_id'].to_numpy(dtype=np.intp)
+        return row_indices, features_df[feature_columns].to_numpy(dtype=np.float64)
     
-    def _compare_feature_vectors(self, features1: np.ndarray, features2: np.ndarray, 
-                               tolerance: float = 1e-6) -> bool:
-        """Compare two feature vectors for equality with tolerance."""
-        if features1.shape != features2.shape:
-            return False
+    def _find_inconsistent_rows(self, training_matrix: np.ndarray, inference_matrix: np.ndarray,
+                                tolerance: float = 1e-6) -> np.ndarray:
+        """Return a boolean mask of rows whose feature vectors differ beyond tolerance."""
+        if training_matrix.shape != inference_matrix.shape:
+            return np.ones(len(training_matrix), dtype=bool)
         
-        return np.allclose(features1, features2, atol=tolerance)
+        return _rows_differ(
+            np.ascontiguousarray(training_matrix, dtype=np.float64),
+            np.ascontiguousarray(inference_matrix, dtype=np.float64),
+            tolerance, 1e-5
+        )
     
     def validate_feature_ranges(self, features_df: pd.DataFrame) -> Dict[str, Any]:
         """Validate that features are within expected ranges."""
@@ -109,43 +185,49 @@ class FeatureValidator:
         }
         
         feature_columns = [col for col in features_df.columns if col != 'transaction_id']
+        values = features_df[feature_columns].to_numpy(dtype=np.float64)
+        null_counts = np.count_nonzero(np.isnan(values), axis=0)
         
-        for column in feature_columns:
-            if column not in features_df.columns:
-                validation_results['issues'].append(f"Missing feature: {column}")
-                validation_results['valid'] = False
-                continue
-            
-            values = features_df[column].values
-            
-            # Calculate statistics
+        # Calculate statistics for all features at once
+        means = np.mean(values, axis=0)
+        stds = np.std(values, axis=0)
+        mins = np.min(values, axis=0)
+        maxs = np.max(values, axis=0)
+        
+        # Column kinds for feature-specific validations
+        prob_mask = np.array([('probability' in c) or ('score' in c) for c in feature_columns], dtype=bool)
+        count_mask = np.array(['count' in c for c in feature_columns], dtype=bool)
+        
+        # One vectorized pass per constraint family
+        has_inf = np.any(np.isinf(values), axis=0)
+        out_of_range = np.zeros(len(feature_columns), dtype=bool)
+        out_of_range[prob_mask] = np.any((values[:, prob_mask] < 0) | (values[:, prob_mask] > 1), axis=0)
+        negative_count = np.zeros(len(feature_columns), dtype=bool)
+        negative_count[count_mask] = np.any(values[:, count_mask] < 0, axis=0)
+        
+        for i, column in enumerate(feature_columns):
             validation_results['feature_stats'][column] = {
-                'mean': float(np.mean(values)),
-                'std': float(np.std(values)),
-                'min': float(np.min(values)),
-                'max': float(np.max(values)),
-                'null_count': int(np.sum(pd.isna(values)))
+                'mean': float(means[i]),
+                'std': float(stds[i]),
+                'min': float(mins[i]),
+                'max': float(maxs[i]),
+                'null_count': int(null_counts[i])
             }
             
             # Check for issues
-            if np.any(pd.isna(values)):
+            if null_counts[i] > 0:
                 validation_results['issues'].append(f"Feature {column} has null values")
-                validation_results['valid'] = False
             
-            if np.any(np.isinf(values)):
+            if has_inf[i]:
                 validation_results['issues'].append(f"Feature {column} has infinite values")
-                validation_results['valid'] = False
             
-            # Feature-specific validations
-            if 'probability' in column or 'score' in column:
-                if np.any((values < 0) | (values > 1)):
-                    validation_results['issues'].append(f"Feature {column} has values outside [0,1] range")
-                    validation_results['valid'] = False
+            if out_of_range[i]:
+                validation_results['issues'].append(f"Feature {column} has values outside [0,1] range")
             
-            if 'count' in column:
-                if np.any(values < 0):
-                    validation_results['issues'].append(f"Feature {column} has negative count values")
-                    validation_results['valid'] = False
+            if negative_count[i]:
+                validation_results['issues'].append(f"Feature {column} has negative count values")
+        
+        validation_results['valid'] = not validation_results['issues']
         
         return validation_results
     
@@ -165,6 +247,7 @@ class FeatureValidator:
         }
         
         # Feature-wise analysis
+        null_counts = features_df[feature_columns].isna().sum(axis=0)
         for column in feature_columns:
             if column in features_df.columns:
                 values = features_df[column].values
@@ -183,7 +266,7 @@ class FeatureValidator:
                         'p95': float(np.percentile(values, 95)),
                         'p99': float(np.percentile(values, 99))
                     },
-                    'null_count': int(np.sum(pd.isna(values))),
+                    'null_count': int(null_counts[column]),
                     'unique_count': int(features_df[column].nunique())
                 }
         
@@ -191,24 +274,32 @@ class FeatureValidator:
         if len(feature_columns) < 50:
             numeric_features = features_df[feature_columns].select_dtypes(include=[np.number])
             if len(numeric_features.columns) > 1:
-                corr_matrix = numeric_features.corr()
+                cols = list(numeric_features.columns)
+                X = numeric_features.to_numpy(dtype=np.float64)
                 
-                # Find highly correlated feature pairs
-                high_correlations = []
-                for i in range(len(corr_matrix.columns)):
-                    for j in range(i+1, len(corr_matrix.columns)):
-                        corr_value = corr_matrix.iloc[i, j]
-                        if abs(corr_value) > 0.8:  # High correlation threshold
-                            high_correlations.append({
-                                'feature1': corr_matrix.columns[i],
-                                'feature2': corr_matrix.columns[j],
-                                'correlation': float(corr_value)
-                            })
+                # Correlate over complete rows so one null doesn't blank out a whole column
+                X = X[~np.isnan(X).any(axis=1)]
+                
+                # Constant columns yield NaN correlations, which are skipped below
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    corr_matrix = np.corrcoef(X.T)
+                abs_corr = np.abs(corr_matrix)
+                
+                # Find highly correlated feature pairs (upper triangle only)
+                pairs = np.argwhere(np.triu(abs_corr > 0.8, k=1))  # High correlation threshold
+                high_correlations = [
+                    {
+                        'feature1': cols[i],
+                        'feature2': cols[j],
+                        'correlation': float(corr_matrix[i, j])
+                    }
+                    for i, j in pairs
+                ]
                 
                 report['correlations'] = {
                     'high_correlations': high_correlations,
-                    'max_correlation': float(corr_matrix.abs().max().max()),
-                    'mean_correlation': float(corr_matrix.abs().mean().mean())
+                    'max_correlation': float(np.nanmax(abs_corr)),
+                    'mean_correlation': float(np.nanmean(abs_corr))
                 }
         
         return report
@@ -216,29 +307,45 @@ class FeatureValidator:
 class FeatureMonitor:
     """Monitor feature drift and quality in production."""
     
+    __slots__ = ('logger', 'baseline_stats', '_cols', '_base_mean', '_base_std',
+                 '_base_min', '_base_max')
+    
     def __init__(self):
         self.logger = get_logger(__name__)
         self.baseline_stats = None
+        
+        # Baseline statistics aligned to self._cols for vectorized drift checks
+        self._cols = []
+        self._base_mean = None
+        self._base_std = None
+        self._base_min = None
+        self._base_max = None
     
     def set_baseline(self, features_df: pd.DataFrame):
         """Set baseline feature statistics for drift detection."""
         feature_columns = [col for col in features_df.columns if col != 'transaction_id']
         
+        arr = features_df[feature_columns].to_numpy(dtype=np.float64)
+        self._cols = feature_columns
+        self._base_mean = np.mean(arr, axis=0)
+        self._base_std = np.std(arr, axis=0)
+        self._base_min = np.min(arr, axis=0)
+        self._base_max = np.max(arr, axis=0)
+        percentiles = np.percentile(arr, [25, 50, 75], axis=0)
+        
         self.baseline_stats = {}
-        for column in feature_columns:
-            if column in features_df.columns:
-                values = features_df[column].values
-                self.baseline_stats[column] = {
-                    'mean': float(np.mean(values)),
-                    'std': float(np.std(values)),
-                    'min': float(np.min(values)),
-                    'max': float(np.max(values)),
-                    'percentiles': {
-                        'p25': float(np.percentile(values, 25)),
-                        'p50': float(np.percentile(values, 50)),
-                        'p75': float(np.percentile(values, 75))
-                    }
+        for i, column in enumerate(feature_columns):
+            self.baseline_stats[column] = {
+                'mean': float(self._base_mean[i]),
+                'std': float(self._base_std[i]),
+                'min': float(self._base_min[i]),
+                'max': float(self._base_max[i]),
+                'percentiles': {
+                    'p25': float(percentiles[0, i]),
+                    'p50': float(percentiles[1, i]),
+                    'p75': float(percentiles[2, i])
                 }
+            }
     
     def detect_drift(self, current_features_df: pd.DataFrame, 
                     drift_threshold: float = 0.1) -> Dict[str, Any]:
@@ -253,40 +360,43 @@ class FeatureMonitor:
             'overall_drift_score': 0.0
         }
         
-        feature_columns = [col for col in current_features_df.columns if col != 'transaction_id']
-        drift_scores = []
+        # Project current features onto the baseline column order
+        current_columns = set(current_features_df.columns)
+        idx = np.array([i for i, col in enumerate(self._cols) if col in current_columns], dtype=np.intp)
+        if len(idx) == 0:
+            return drift_report
         
-        for column in feature_columns:
-            if column in current_features_df.columns and column in self.baseline_stats:
-                current_values = current_features_df[column].values
-                baseline_stats = self.baseline_stats[column]
-                
-                # Calculate current statistics
-                current_stats = {
-                    'mean': float(np.mean(current_values)),
-                    'std': float(np.std(current_values)),
-                    'min': float(np.min(current_values)),
-                    'max': float(np.max(current_values))
-                }
-                
-                # Calculate drift score (normalized difference in means and stds)
-                mean_diff = abs(current_stats['mean'] - baseline_stats['mean']) / (baseline_stats['std'] + 1e-6)
-                std_diff = abs(current_stats['std'] - baseline_stats['std']) / (baseline_stats['std'] + 1e-6)
-                
-                drift_score = (mean_diff + std_diff) / 2
-                drift_scores.append(drift_score)
-                
-                drift_report['feature_comparisons'][column] = {
-                    'baseline': baseline_stats,
-                    'current': current_stats,
-                    'drift_score': drift_score,
-                    'has_drift': drift_score > drift_threshold
-                }
-                
-                if drift_score > drift_threshold:
-                    drift_report['drifted_features'].append(column)
-                    drift_report['has_drift'] = True
+        columns = [self._cols[i] for i in idx]
+        arr = current_features_df[columns].to_numpy(dtype=np.float64)
+        base_mean = self._base_mean[idx]
+        base_std = self._base_std[idx]
+        
+        # Calculate current statistics for all features at once
+        cur_mean = np.nanmean(arr, axis=0)
+        cur_std = np.nanstd(arr, axis=0)
+        cur_min = np.nanmin(arr, axis=0)
+        cur_max = np.nanmax(arr, axis=0)
+        
+        # Drift score: normalized difference in means and stds
+        drift = (np.abs(cur_mean - base_mean) + np.abs(cur_std - base_std)) / (2 * (base_std + 1e-6))
+        drifted = drift > drift_threshold
+        
+        for i, column in enumerate(columns):
+            drift_report['feature_comparisons'][column] = {
+                'baseline': self.baseline_stats[column],
+                'current': {
+                    'mean': float(cur_mean[i]),
+                    'std': float(cur_std[i]),
+                    'min': float(cur_min[i]),
+                    'max': float(cur_max[i])
+                },
+                'drift_score': float(drift[i]),
+                'has_drift': bool(drifted[i])
+            }
         
-        drift_report['overall_drift_score'] = float(np.mean(drift_scores)) if drift_scores else 0.0
+        drifted_idx = np.where(drifted)[0]
+        drift_report['drifted_features'] = [columns[i] for i in drifted_idx]
+        drift_report['has_drift'] = len(drifted_idx) > 0
+        drift_report['overall_drift_score'] = float(np.mean(drift))
         
         return drift_report
\ No newline at end of file
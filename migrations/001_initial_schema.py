@@ -18,18 +18,27 @@ def create_database(config_name='development'):
     base_url = app_config.SQLALCHEMY_DATABASE_URI.rsplit('/', 1)[0]
     db_name = app_config.DB_NAME
     
-    engine = create_engine(base_url, echo=True)
+    # Set MIGRATION_ECHO=1 to log the emitted SQL
+    echo = os.environ.get('MIGRATION_ECHO') == '1'
     
-    with engine.connect() as connection:
-        # Create database
-        connection.execute(text(f"CREATE DATABASE IF NOT EXISTS {db_name}"))
-        connection.commit()
+    # MySQL DDL is not transactional, so run it in autocommit mode
+    engine = create_engine(base_url, echo=echo, isolation_level="AUTOCOMMIT")
+    
+    try:
+        with engine.begin() as connection:
+            # Create database
+            connection.execute(text(f"CREATE DATABASE IF NOT EXISTS {db_name}"))
+    finally:
+        engine.dispose()
     
     # Connect to the specific database
-    db_engine = create_engine(app_config.SQLALCHEMY_DATABASE_URI, echo=True)
+    db_engine = create_engine(app_config.SQLALCHEMY_DATABASE_URI, echo=echo)
     
-    # Create all tables
-    Base.metadata.create_all(db_engine)
+    try:
+        # Create all tables
+        Base.metadata.create_all(db_engine)
+    finally:
+        db_engine.dispose()
     
     print(f"Database '{db_name}' and all tables created successfully!")
 
@@ -0,0 +1,73 @@
+"""Replace the users.email indexes with the case-insensitive ix_users_email_lower index."""
+
+from sqlalchemy import create_engine, text
+import sys
+import os
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from models.database import User
+from config.config import config
+
+# Indexes superseded by ix_users_email_lower: the column-level unique index and the plain one
+SUPERSEDED_INDEXES = ('ix_users_email', 'idx_users_email')
+
+# Reflection skips expression-based indexes on some dialects, so read index names from the catalog
+INDEX_NAME_QUERIES = {
+    'mysql': "SELECT DISTINCT index_name FROM information_schema.statistics "
+             "WHERE table_schema = DATABASE() AND table_name = 'users'",
+    'postgresql': "SELECT indexname FROM pg_indexes WHERE tablename = 'users'",
+    'sqlite': "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'users'",
+}
+
+def _index_names(connection):
+    """Return the names of every index on the users table."""
+    query = INDEX_NAME_QUERIES[connection.dialect.name]
+    return set(connection.execute(text(query)).scalars())
+
+def migrate(config_name='development'):
+    """Create the unique lower(email) index and drop the email indexes it replaces."""
+    app_config = config[config_name]
+
+    # Set MIGRATION_ECHO=1 to log the emitted SQL
+    echo = os.environ.get('MIGRATION_ECHO') == '1'
+
+    db_engine = create_engine(app_config.SQLALCHEMY_DATABASE_URI, echo=echo)
+
+    try:
+        if db_engine.dialect.name == 'mariadb':
+            # MariaDB has no functional key parts; MySQL needs 8.0.13+ for ((lower(email)))
+            raise RuntimeError("MariaDB does not support functional indexes on lower(email)")
+        if db_engine.dialect.name not in INDEX_NAME_QUERIES:
+            raise RuntimeError(f"Unsupported database dialect: {db_engine.dialect.name}")
+
+        with db_engine.begin() as connection:
+            # The unique index cannot be built while emails collide case-insensitively
+            duplicates = connection.execute(text(
+                "SELECT lower(email) FROM users GROUP BY lower(email) HAVING count(*) > 1"
+            )).scalars().all()
+            if duplicates:
+                raise RuntimeError(f"Resolve duplicate emails before migrating: {duplicates}")
+
+            existing = _index_names(connection)
+            if 'ix_users_email_lower' not in existing:
+                email_lower_index = next(
+                    index for index in User.__table__.indexes if index.name == 'ix_users_email_lower'
+                )
+                email_lower_index.create(connection)
+
+            for name in SUPERSEDED_INDEXES:
+                if name in existing:
+                    if connection.dialect.name == 'mysql':
+                        connection.execute(text(f"DROP INDEX {name} ON users"))
+                    else:
+                        connection.execute(text(f"DROP INDEX {name}"))
+    finally:
+        db_engine.dispose()
+
+    print("Migrated users.email to the case-insensitive ix_users_email_lower index")
+
+if __name__ == "__main__":
+    config_name = sys.argv[1] if len(sys.argv) > 1 else 'development'
+    migrate(config_name)
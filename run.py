@@ -12,5 +12,18 @@ if __name__ == '__main__':
     port = int(os.environ.get('FLASK_PORT', 5000))
     debug = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     
-    # Run the application
-    app.run(host=host, port=port, debug=debug)
\ No newline at end of file
+    # FLASK_DEBUG=true (or USE_WAITRESS=0) runs Werkzeug's single-threaded dev server
+    if not debug and os.environ.get('USE_WAITRESS', '1') == '1':
+        from waitress import serve
+        
+        serve(
+            app,
+            host=host,
+            port=port,
+            threads=int(os.environ.get('WAITRESS_THREADS', '8')),
+            connection_limit=1000,
+            channel_timeout=60
+        )
+    else:
+        # Run the application
+        app.run(host=host, port=port, debug=debug)
\ No newline at end of file
@@ -30,7 +30,7 @@ def init_auth_system():
             print("Creating database tables...")
             db_manager.create_tables()
             
-            # Create default users
+            # Create default users; only missing ones are hashed and inserted
             print("Creating default users...")
             with db_manager.get_session() as session:
                 User.create_default_users(session)
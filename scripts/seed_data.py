@@ -6,9 +6,13 @@ Database seeding script for FraudNet.AI development and testing.
 import os
 import sys
 import argparse
-from datetime import datetime, timedelta
+from datetime import timedelta
 import random
 
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, select, text
+
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -17,110 +21,165 @@ from app.models.database import db, User, Transaction, Prediction, ModelRegistry
 from app.core.database_manager import DatabaseManager
 
 
-def create_sample_users(count: int = 100):
-    """Create sample users."""
-    users = []
-    for i in range(count):
-        user = User(
+_MERCHANTS = (
+    'Amazon', 'Walmart', 'Target', 'Best Buy', 'Home Depot',
+    'Starbucks', 'McDonald\'s', 'Shell', 'Exxon', 'CVS',
+    'Local Store', 'Online Shop', 'Gas Station', 'Restaurant', 'Mall'
+)
+_CATEGORIES = (
+    'grocery', 'electronics', 'fuel', 'restaurant', 'retail',
+    'entertainment', 'travel', 'healthcare', 'utilities', 'other'
+)
+_CITIES = (
+    'New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix',
+    'Toronto', 'London', 'Berlin', 'Paris', 'Madrid'
+)
+_COUNTRIES = ('US', 'CA', 'GB', 'DE', 'FR')
+_PAYMENT = ('credit_card', 'debit_card', 'bank_transfer', 'digital_wallet')
+_DEVICE = ('mobile', 'web', 'pos')
+
+# Object arrays built once so columns can be drawn with a single fancy index
+_MERCHANTS_ARR = np.array(_MERCHANTS, dtype=object)
+_CATEGORIES_ARR = np.array(_CATEGORIES, dtype=object)
+_CITIES_ARR = np.array(_CITIES, dtype=object)
+_COUNTRIES_ARR = np.array(_COUNTRIES, dtype=object)
+_PAYMENT_ARR = np.array(_PAYMENT, dtype=object)
+_DEVICE_ARR = np.array(_DEVICE, dtype=object)
+
+
+def insert_rows(model, rows: list, *columns) -> list:
+    """Bulk insert plain dict rows and return the given columns (default: id) in row order."""
+    if not rows:
+        return []
+    
+    columns = columns or (model.id,)
+    dialect = db.engine.dialect
+    if dialect.insert_executemany_returning_sort_by_parameter_order:
+        stmt = insert(model).returning(*columns, sort_by_parameter_order=True)
+        result = db.session.execute(stmt, rows).all()
+    else:
+        # No executemany RETURNING (e.g. MySQL): read back the newest rows.
+        # Safe here because the seeder is the only writer.
+        db.session.execute(insert(model), rows)
+        result = db.session.execute(
+            select(*columns).order_by(model.id.desc()).limit(len(rows))
+        ).all()[::-1]
+    
+    if len(columns) == 1:
+        return [row[0] for row in result]
+    return [tuple(row) for row in result]
+
+
+def create_sample_users(count: int = 100, commit: bool = False, seed: int = 42):
+    """Create sample users and return their ids as an int64 array."""
+    rng = np.random.default_rng(seed)
+    rng_py = random.Random(seed)
+    registration_dates = (
+        pd.Timestamp.now() - pd.to_timedelta(rng.integers(1, 366, count), unit='D')
+    ).to_pydatetime()
+    
+    user_rows = []
+    for i, registration_date in enumerate(registration_dates):
+        user_rows.append(dict(
             user_id=f"user_{i:06d}",
             email=f"user{i}@example.com",
             phone=f"+1555{i:07d}",
-            registration_date=datetime.now() - timedelta(days=random.randint(1, 365)),
-            user_type=random.choice(['premium', 'basic', 'enterprise'])
-        )
-        users.append(user)
+            registration_date=registration_date,
+            user_type=rng_py.choice(['premium', 'basic', 'enterprise'])
+        ))
     
-    db.session.bulk_save_objects(users)
-    db.session.commit()
+    user_ids = np.asarray(insert_rows(User, user_rows), dtype=np.int64)
+    if commit:
+        db.session.commit()
     print(f"Created {count} sample users")
-    return users
+    return user_ids
 
 
-def create_sample_transactions(users: list, count: int = 1000):
+def create_sample_transactions(user_ids: np.ndarray, count: int = 1000, commit: bool = False,
+                               seed: int = 42):
     """Create sample transactions."""
     transactions = []
-    merchants = [
-        'Amazon', 'Walmart', 'Target', 'Best Buy', 'Home Depot',
-        'Starbucks', 'McDonald\'s', 'Shell', 'Exxon', 'CVS',
-        'Local Store', 'Online Shop', 'Gas Station', 'Restaurant', 'Mall'
-    ]
     
-    categories = [
-        'grocery', 'electronics', 'fuel', 'restaurant', 'retail',
-        'entertainment', 'travel', 'healthcare', 'utilities', 'other'
-    ]
+    # Draw every column at once instead of per row
+    rng = np.random.default_rng(seed)
+    is_fraud = rng.random(count) < 0.05  # 5% fraud rate
     
-    for i in range(count):
-        user = random.choice(users)
-        is_fraud = random.random() < 0.05  # 5% fraud rate
-        
-        # Fraud transactions tend to be higher amounts and unusual times
-        if is_fraud:
-            amount = random.uniform(500, 5000)
-            hour = random.choice([2, 3, 4, 23, 24, 1])  # Unusual hours
-        else:
-            amount = random.uniform(5, 500)
-            hour = random.randint(6, 22)  # Normal business hours
-        
-        transaction = Transaction(
+    # Fraud transactions tend to be higher amounts
+    amount = np.where(is_fraud, rng.uniform(500, 5000, count), rng.uniform(5, 500, count)).round(2)
+    
+    transaction_user_ids = rng.choice(user_ids, size=count)
+    transaction_date = (
+        pd.Timestamp.now() - pd.to_timedelta(rng.integers(0, 30 * 24 * 60, count), unit='m')
+    ).to_pydatetime()
+    
+    columns = zip(
+        transaction_user_ids.tolist(),
+        amount.tolist(),
+        _MERCHANTS_ARR[rng.integers(0, len(_MERCHANTS_ARR), count)].tolist(),
+        _CATEGORIES_ARR[rng.integers(0, len(_CATEGORIES_ARR), count)].tolist(),
+        transaction_date,
+        _COUNTRIES_ARR[rng.integers(0, len(_COUNTRIES_ARR), count)].tolist(),
+        _CITIES_ARR[rng.integers(0, len(_CITIES_ARR), count)].tolist(),
+        _PAYMENT_ARR[rng.integers(0, len(_PAYMENT_ARR), count)].tolist(),
+        _DEVICE_ARR[rng.integers(0, len(_DEVICE_ARR), count)].tolist(),
+        is_fraud.tolist()
+    )
+    for i, (user_id, amt, merchant, category, date, country, city, payment, device, fraud) in enumerate(columns):
+        transactions.append(dict(
             transaction_id=f"txn_{i:08d}",
-            user_id=user.id,
-            amount=round(amount, 2),
-            merchant=random.choice(merchants),
-            merchant_category=random.choice(categories),
-            transaction_date=datetime.now() - timedelta(
-                days=random.randint(0, 30),
-                hours=random.randint(0, 23),
-                minutes=random.randint(0, 59)
-            ),
-            location_country=random.choice(['US', 'CA', 'GB', 'DE', 'FR']),
-            location_city=random.choice([
-                'New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix',
-                'Toronto', 'London', 'Berlin', 'Paris', 'Madrid'
-            ]),
-            payment_method=random.choice(['credit_card', 'debit_card', 'bank_transfer', 'digital_wallet']),
-            device_type=random.choice(['mobile', 'web', 'pos']),
-            is_fraud=is_fraud
-        )
-        transactions.append(transaction)
+            user_id=user_id,
+            amount=amt,
+            merchant=merchant,
+            merchant_category=category,
+            transaction_date=date,
+            location_country=country,
+            location_city=city,
+            payment_method=payment,
+            device_type=device,
+            is_fraud=fraud
+        ))
+    
+    tx_meta = insert_rows(
+        Transaction, transactions,
+        Transaction.id, Transaction.transaction_date, Transaction.is_fraud
+    )
     
-    db.session.bulk_save_objects(transactions)
-    db.session.commit()
-    print(f"Created {count} sample transactions ({sum(1 for t in transactions if t.is_fraud)} fraud)")
-    return transactions
+    if commit:
+        db.session.commit()
+    print(f"Created {count} sample transactions ({int(is_fraud.sum())} fraud)")
+    return tx_meta
 
 
-def create_sample_predictions(transactions: list, count: int = 500):
-    """Create sample predictions."""
+def create_sample_predictions(tx_meta: list, count: int = 500, commit: bool = False, seed: int = 42):
+    """Create sample predictions from (id, transaction_date, is_fraud) tuples."""
+    rng_py = random.Random(seed)
     predictions = []
     model_versions = ['v1.0', 'v1.1', 'v1.2']
     
-    for i in range(min(count, len(transactions))):
-        transaction = transactions[i]
-        
+    for transaction_id, transaction_date, is_fraud in tx_meta[:count]:
         # Simulate model predictions (with some accuracy)
-        if transaction.is_fraud:
-            fraud_probability = random.uniform(0.7, 0.95)  # High probability for actual fraud
+        if is_fraud:
+            fraud_probability = rng_py.uniform(0.7, 0.95)  # High probability for actual fraud
         else:
-            fraud_probability = random.uniform(0.01, 0.3)  # Low probability for legitimate
+            fraud_probability = rng_py.uniform(0.01, 0.3)  # Low probability for legitimate
         
-        prediction = Prediction(
-            transaction_id=transaction.id,
-            model_version=random.choice(model_versions),
+        predictions.append(dict(
+            transaction_id=transaction_id,
+            model_version=rng_py.choice(model_versions),
             fraud_probability=fraud_probability,
             risk_level='high' if fraud_probability > 0.8 else 'medium' if fraud_probability > 0.5 else 'low',
-            prediction_date=transaction.transaction_date + timedelta(seconds=random.randint(1, 10)),
-            processing_time_ms=random.randint(50, 200)
-        )
-        predictions.append(prediction)
+            prediction_date=transaction_date + timedelta(seconds=rng_py.randint(1, 10)),
+            processing_time_ms=rng_py.randint(50, 200)
+        ))
     
-    db.session.bulk_save_objects(predictions)
-    db.session.commit()
+    insert_rows(Prediction, predictions)
+    if commit:
+        db.session.commit()
     print(f"Created {len(predictions)} sample predictions")
     return predictions
 
 
-def create_sample_model_registry():
+def create_sample_model_registry(commit: bool = False):
     """Create sample model registry entries."""
     models = [
         {
@@ -161,60 +220,95 @@ def create_sample_model_registry():
         }
     ]
     
-    for model_data in models:
-        model = ModelRegistry(**model_data)
-        db.session.add(model)
+    insert_rows(ModelRegistry, models)
     
-    db.session.commit()
+    if commit:
+        db.session.commit()
     print(f"Created {len(models)} model registry entries")
 
 
-def create_sample_audit_logs(count: int = 200):
+def create_sample_audit_logs(count: int = 200, commit: bool = False, seed: int = 42):
     """Create sample audit log entries."""
+    rng_py = random.Random(seed)
     actions = ['CREATE', 'UPDATE', 'DELETE', 'LOGIN', 'LOGOUT', 'PREDICT', 'TRAIN']
     entities = ['User', 'Transaction', 'Model', 'Prediction']
     
     logs = []
     for i in range(count):
-        log = AuditLog(
-            action=random.choice(actions),
-            entity_type=random.choice(entities),
-            entity_id=random.randint(1, 1000),
-            user_id=f"user_{random.randint(0, 99):06d}",
+        logs.append(dict(
+            action=rng_py.choice(actions),
+            entity_type=rng_py.choice(entities),
+            entity_id=rng_py.randint(1, 1000),
+            user_id=f"user_{rng_py.randint(0, 99):06d}",
             changes=f'{{"field": "updated", "old_value": "old", "new_value": "new"}}',
-            ip_address=f"192.168.{random.randint(1, 255)}.{random.randint(1, 255)}",
+            ip_address=f"192.168.{rng_py.randint(1, 255)}.{rng_py.randint(1, 255)}",
             user_agent="FraudNet.AI/1.0"
-        )
-        logs.append(log)
+        ))
     
-    db.session.bulk_save_objects(logs)
-    db.session.commit()
+    insert_rows(AuditLog, logs)
+    if commit:
+        db.session.commit()
     print(f"Created {count} audit log entries")
 
 
 def seed_database(users_count: int = 100, transactions_count: int = 1000, 
-                 predictions_count: int = 500, audit_logs_count: int = 200):
-    """Seed the database with sample data."""
+                 predictions_count: int = 500, audit_logs_count: int = 200,
+                 commit: bool = True, seed: int = 42):
+    """Seed the database with sample data in a single transaction."""
     print("Starting database seeding...")
     
-    # Create users first
-    users = create_sample_users(users_count)
+    # Independent, reproducible streams so the seeders don't draw correlated values
+    user_seed, tx_seed, prediction_seed, audit_seed = (
+        int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(4)
+    )
     
-    # Create transactions
-    transactions = create_sample_transactions(users, transactions_count)
-    
-    # Create predictions
-    create_sample_predictions(transactions, predictions_count)
-    
-    # Create model registry entries
-    create_sample_model_registry()
-    
-    # Create audit logs
-    create_sample_audit_logs(audit_logs_count)
+    try:
+        # Create users first
+        user_ids = create_sample_users(users_count, seed=user_seed)
+        
+        # Create transactions
+        tx_meta = create_sample_transactions(user_ids, transactions_count, seed=tx_seed)
+        
+        # Create predictions
+        create_sample_predictions(tx_meta, predictions_count, seed=prediction_seed)
+        
+        # Create model registry entries
+        create_sample_model_registry()
+        
+        # Create audit logs
+        create_sample_audit_logs(audit_logs_count, seed=audit_seed)
+        
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
     
     print("Database seeding completed successfully!")
 
 
+def reset_database(db_manager):
+    """Empty all tables, keeping the schema where the backend supports TRUNCATE."""
+    dialect = db.engine.dialect.name
+    tables = [table.name for table in reversed(db.metadata.sorted_tables)]
+    
+    if dialect == 'postgresql':
+        db.session.execute(text(f"TRUNCATE TABLE {', '.join(tables)} RESTART IDENTITY CASCADE"))
+        db.session.commit()
+    elif dialect in ('mysql', 'mariadb'):
+        # MySQL truncates one table at a time and resets AUTO_INCREMENT itself
+        db.session.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+        try:
+            for table in tables:
+                db.session.execute(text(f"TRUNCATE TABLE {table}"))
+        finally:
+            db.session.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
+        db.session.commit()
+    else:
+        db.drop_all()
+        db_manager.create_tables()
+
+
 def main():
     """Main function."""
     parser = argparse.ArgumentParser(description='Seed FraudNet.AI database with sample data')
@@ -222,6 +316,7 @@ def main():
     parser.add_argument('--transactions', type=int, default=1000, help='Number of transactions to create')
     parser.add_argument('--predictions', type=int, default=500, help='Number of predictions to create')
     parser.add_argument('--audit-logs', type=int, default=200, help='Number of audit logs to create')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducible data')
     parser.add_argument('--reset', action='store_true', help='Reset database before seeding')
     
     args = parser.parse_args()
@@ -236,15 +331,15 @@ def main():
             
             if args.reset:
                 print("Resetting database...")
-                db.drop_all()
-                db_manager.create_tables()
+                reset_database(db_manager)
             
             # Seed the database
             seed_database(
                 users_count=args.users,
                 transactions_count=args.transactions,
                 predictions_count=args.predictions,
-                audit_logs_count=args.audit_logs
+                audit_logs_count=args.audit_logs,
+                seed=args.seed
             )
             
         except Exception as e:
@@ -4,106 +4,219 @@ import os
 import pytest
 import tempfile
 import shutil
+from pathlib import Path
 from datetime import datetime, timedelta
+from unittest.mock import patch, DEFAULT
 import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import orjson
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
 
 from app import create_app
 from app.models.database import Base, User, Transaction, Prediction, ModelRegistry
 from app.utils.database import DatabaseManager
 from app.config.config import TestingConfig
 
-# Test configuration
-TEST_DB_URL = 'sqlite:///:memory:'
+from helpers import mock_first_query
+
+# Test configuration: one database per xdist worker, either a file on tmpfs when
+# available or, with TEST_DB=memory, a shared-cache in-memory database
+_TEST_DB_WORKER = os.environ.get('PYTEST_XDIST_WORKER', 'gw0')
+if os.environ.get('TEST_DB') == 'memory':
+    TEST_DB_PATH = None
+    TEST_DB_URL = f'sqlite:///file:memdb_{_TEST_DB_WORKER}?mode=memory&cache=shared&uri=true'
+else:
+    _TEST_DB_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    TEST_DB_PATH = os.path.join(_TEST_DB_DIR, f'test_{_TEST_DB_WORKER}.db')
+    TEST_DB_URL = f'sqlite:///{TEST_DB_PATH}'
+TEST_ENGINE_KWARGS = {
+    'poolclass': StaticPool,
+    'connect_args': {'check_same_thread': False}
+}
+
+_SLOW_TEST_KEYWORDS = ('pipeline', 'transaction')
+
+def pytest_collection_modifyitems(items):
+    """Move files with pipeline or transaction tests first so --dist=loadfile hands them out early.
+    
+    Files are reordered as whole groups, so module-scoped fixtures are set up once per file.
+    """
+    slow_files = {
+        item.nodeid.split('::', 1)[0] for item in items
+        if any(k in item.name for k in _SLOW_TEST_KEYWORDS)
+    }
+    items.sort(key=lambda item: 0 if item.nodeid.split('::', 1)[0] in slow_files else 1)
+
+class _OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; unsupported types fall back to Flask's default."""
+    
+    _OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._OPTIONS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 @pytest.fixture(scope='session')
 def app():
     """Create Flask app for testing."""
-    # Use in-memory SQLite for tests
+    # Point the app at this worker's test database
     TestingConfig.SQLALCHEMY_DATABASE_URI = TEST_DB_URL
     
     app = create_app('testing')
-    app.config['TESTING'] = True
+    app.config.update(TESTING=True)
+    app.json = _OrjsonProvider(app)
     
     with app.app_context():
         yield app
 
-@pytest.fixture(scope='session')
+@pytest.fixture
 def client(app):
-    """Create test client."""
+    """Create test client for the session-wide app."""
     return app.test_client()
 
-@pytest.fixture(scope='function')
-def db_session():
-    """Create database session for testing."""
-    engine = create_engine(TEST_DB_URL, echo=False)
-    Session = sessionmaker(bind=engine)
+@pytest.fixture(scope='module')
+def _db_session_patch():
+    """Patch app.db_manager.get_session once per module."""
+    with patch('app.db_manager.get_session') as mock_get_session:
+        yield mock_get_session
+
+@pytest.fixture
+def mocked_db_session(_db_session_patch):
+    """Patched get_session, reset to hand out a fresh session mock for each test."""
+    _db_session_patch.reset_mock(return_value=True, side_effect=True)
+    _db_session_patch.return_value = mock_first_query()
+    return _db_session_patch
+
+@pytest.fixture(scope='module')
+def _fraud_detector_patch():
+    """Patch the global fraud detector's model calls once per module."""
+    with patch.multiple('app.fraud_detector', get_model_status=DEFAULT,
+                        predict_fraud=DEFAULT, save_prediction=DEFAULT) as mocks:
+        yield mocks
+
+@pytest.fixture
+def mocked_fraud_detector(_fraud_detector_patch):
+    """Patched fraud detector methods, keyed by name and reset for each test."""
+    for mock in _fraud_detector_patch.values():
+        mock.reset_mock(return_value=True, side_effect=True)
+    return _fraud_detector_patch
+
+@pytest.fixture(scope='session')
+def db_engine():
+    """Create the test engine and schema once per session."""
+    # Start clean if an earlier run was interrupted before teardown
+    if TEST_DB_PATH and os.path.exists(TEST_DB_PATH):
+        os.remove(TEST_DB_PATH)
+    
+    engine = create_engine(TEST_DB_URL, echo=False, **TEST_ENGINE_KWARGS)
+    
+    # Let SQLAlchemy emit BEGIN itself so pysqlite doesn't break SAVEPOINT handling
+    @event.listens_for(engine, 'connect')
+    def _disable_pysqlite_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(engine, 'begin')
+    def _emit_begin(connection):
+        connection.exec_driver_sql('BEGIN')
     
-    # Create tables
     Base.metadata.create_all(engine)
     
-    session = Session()
+    yield engine
+    
+    engine.dispose()
+    if TEST_DB_PATH:
+        os.remove(TEST_DB_PATH)
+
+@pytest.fixture(scope='function')
+def db_session(db_engine):
+    """Create database session for testing, rolled back after each test.
+    
+    Session commits and rollbacks operate on SAVEPOINTs inside the outer transaction.
+    """
+    connection = db_engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode='create_savepoint')
     
     yield session
     
     session.close()
-    Base.metadata.drop_all(engine)
+    transaction.rollback()
+    connection.close()
 
 @pytest.fixture(scope='function')
-def db_manager():
-    """Create database manager for testing."""
-    manager = DatabaseManager(TEST_DB_URL)
-    manager.create_tables()
+def db_manager(db_engine):
+    """Create database manager for testing on the shared test database."""
+    manager = DatabaseManager(TEST_DB_URL, **TEST_ENGINE_KWARGS)
     
     yield manager
     
-    manager.drop_tables()
+    manager.engine.dispose()
 
 @pytest.fixture(scope='function')
 def temp_artifacts_dir():
     """Create temporary directory for model artifacts."""
-    temp_dir = tempfile.mkdtemp()
+    root = Path(tempfile.mkdtemp())
     
     # Create subdirectories
-    os.makedirs(os.path.join(temp_dir, 'models'), exist_ok=True)
-    os.makedirs(os.path.join(temp_dir, 'metrics'), exist_ok=True)
-    os.makedirs(os.path.join(temp_dir, 'preprocessing'), exist_ok=True)
+    for sub in ('models', 'metrics', 'preprocessing'):
+        (root / sub).mkdir()
     
-    yield temp_dir
+    yield str(root)
     
-    shutil.rmtree(temp_dir)
+    shutil.rmtree(root)
 
 @pytest.fixture
-def sample_user(db_session):
-    """Create sample user for testing."""
-    user = User(
-        name='Test User',
-        email='test@example.com'
-    )
-    db_session.add(user)
-    db_session.commit()
+def make_user(db_session):
+    """Factory for users; rows are flushed, not committed."""
+    counter = iter(range(1, 1_000_000))
     
-    return user
+    def _make_user(**overrides):
+        n = next(counter)
+        fields = {'name': f'Test User {n}', 'email': f'user{n}@example.com', 'password': 'TestPass123!'}
+        fields.update(overrides)
+        user = User(**fields)
+        db_session.add(user)
+        db_session.flush()
+        return user
+    
+    return _make_user
 
 @pytest.fixture
-def sample_transaction(db_session, sample_user):
-    """Create sample transaction for testing."""
-    transaction = Transaction(
-        user_id=sample_user.id,
-        amount=100.50,
-        currency='USD',
-        merchant_category='retail',
-        device_id='device123',
-        ip_address='192.168.1.1',
-        timestamp=datetime.utcnow(),
-        raw_payload={'test': 'data'}
-    )
-    db_session.add(transaction)
-    db_session.commit()
+def make_transaction(db_session, make_user):
+    """Factory for transactions; creates an owning user when none is given."""
+    def _make_transaction(user=None, **overrides):
+        fields = {
+            'user_id': (user or make_user()).id,
+            'amount': 100.50,
+            'currency': 'USD',
+            'merchant_category': 'retail',
+            'device_id': 'device123',
+            'ip_address': '192.168.1.1',
+            'timestamp': datetime.utcnow(),
+            'raw_payload': {'test': 'data'}
+        }
+        fields.update(overrides)
+        transaction = Transaction(**fields)
+        db_session.add(transaction)
+        db_session.flush()
+        return transaction
     
-    return transaction
+    return _make_transaction
+
+@pytest.fixture
+def sample_user(make_user):
+    """Create sample user for testing."""
+    return make_user(name='Test User', email='test@example.com')
+
+@pytest.fixture
+def sample_transaction(make_transaction, sample_user):
+    """Create sample transaction for testing."""
+    return make_transaction(sample_user)
 
 @pytest.fixture
 def sample_prediction(db_session, sample_transaction):
@@ -117,7 +230,7 @@ def sample_prediction(db_session, sample_transaction):
         inference_time_ms=50
     )
     db_session.add(prediction)
-    db_session.commit()
+    db_session.flush()
     
     return prediction
 
@@ -136,14 +249,14 @@ def sample_model_registry(db_session):
         feature_schema_version='1.0.0'
     )
     db_session.add(model)
-    db_session.commit()
+    db_session.flush()
     
     return model
 
-@pytest.fixture
-def mock_training_data():
-    """Generate mock training data."""
-    np.random.seed(42)
+@pytest.fixture(scope='session')
+def _mock_training_data_cached():
+    """Generate mock training data once per session."""
+    rng = np.random.default_rng(42)
     n_samples = 1000
     
     # Generate features
@@ -158,45 +271,50 @@ def mock_training_data():
         'location_velocity_flag', 'unusual_location_flag'
     ]
     
-    # Generate realistic feature data
-    data = {
-        'transaction_id': list(range(1, n_samples + 1)),
-        'amount_normalized': np.random.lognormal(4, 1, n_samples),
-        'currency_risk_score': np.random.beta(2, 5, n_samples),
-        'merchant_risk_score': np.random.beta(2, 5, n_samples),
-        'hour_of_day': np.random.randint(0, 24, n_samples),
-        'day_of_week': np.random.randint(0, 7, n_samples),
-        'is_weekend': np.random.binomial(1, 0.3, n_samples),
-        'is_business_hours': np.random.binomial(1, 0.4, n_samples),
-        'user_transaction_count_24h': np.random.poisson(3, n_samples),
-        'user_avg_transaction_24h': np.random.lognormal(4, 0.5, n_samples),
-        'user_transaction_frequency_1h': np.random.exponential(0.5, n_samples),
-        'user_distinct_merchants_24h': np.random.poisson(2, n_samples),
-        'user_distinct_countries_24h': np.random.poisson(1, n_samples),
-        'user_account_age_days': np.random.exponential(365, n_samples),
-        'device_transaction_count_24h': np.random.poisson(2, n_samples),
-        'device_distinct_users_24h': np.random.poisson(1, n_samples),
-        'device_risk_score': np.random.beta(2, 5, n_samples),
-        'country_risk_score': np.random.beta(2, 8, n_samples),
-        'is_vpn': np.random.binomial(1, 0.1, n_samples),
-        'location_velocity_flag': np.random.binomial(1, 0.05, n_samples),
-        'unusual_location_flag': np.random.binomial(1, 0.15, n_samples)
-    }
+    # Generate realistic feature data straight into one float32 block
+    mat = np.empty((n_samples, len(feature_names)), dtype=np.float32)
+    mat[:, 0] = rng.lognormal(4, 1, n_samples)
+    mat[:, 1] = rng.beta(2, 5, n_samples)
+    mat[:, 2] = rng.beta(2, 5, n_samples)
+    mat[:, 3] = rng.integers(0, 24, n_samples)
+    mat[:, 4] = rng.integers(0, 7, n_samples)
+    mat[:, 5] = rng.binomial(1, 0.3, n_samples)
+    mat[:, 6] = rng.binomial(1, 0.4, n_samples)
+    mat[:, 7] = rng.poisson(3, n_samples)
+    mat[:, 8] = rng.lognormal(4, 0.5, n_samples)
+    mat[:, 9] = rng.exponential(0.5, n_samples)
+    mat[:, 10] = rng.poisson(2, n_samples)
+    mat[:, 11] = rng.poisson(1, n_samples)
+    mat[:, 12] = rng.exponential(365, n_samples)
+    mat[:, 13] = rng.poisson(2, n_samples)
+    mat[:, 14] = rng.poisson(1, n_samples)
+    mat[:, 15] = rng.beta(2, 5, n_samples)
+    mat[:, 16] = rng.beta(2, 8, n_samples)
+    mat[:, 17] = rng.binomial(1, 0.1, n_samples)
+    mat[:, 18] = rng.binomial(1, 0.05, n_samples)
+    mat[:, 19] = rng.binomial(1, 0.15, n_samples)
     
-    features_df = pd.DataFrame(data)
+    features_df = pd.DataFrame(mat, columns=feature_names)
+    features_df.insert(0, 'transaction_id', np.arange(1, n_samples + 1, dtype=np.int32))
     
     # Generate labels with some correlation to features
     fraud_probability = (
-        0.1 * features_df['merchant_risk_score'] +
-        0.1 * features_df['device_risk_score'] +
-        0.05 * features_df['is_vpn'] +
-        0.05 * np.random.beta(1, 10, n_samples)
+        0.1 * mat[:, 2] +
+        0.1 * mat[:, 15] +
+        0.05 * mat[:, 17] +
+        0.05 * rng.beta(1, 10, n_samples)
     )
     
-    labels = pd.Series(np.random.binomial(1, fraud_probability, n_samples), name='is_fraud')
+    labels = pd.Series(rng.binomial(1, fraud_probability), name='is_fraud')
     
     return features_df, labels
 
+@pytest.fixture
+def mock_training_data(_mock_training_data_cached):
+    """Shared mock training data; call .copy() before mutating."""
+    features_df, labels = _mock_training_data_cached
+    return features_df, labels
+
 @pytest.fixture
 def mock_transaction_data():
     """Generate mock transaction data for API testing."""
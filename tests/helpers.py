@@ -0,0 +1,12 @@
+"""Shared helpers for building test doubles."""
+
+from unittest.mock import Mock
+
+
+def mock_first_query(obj=None):
+    """Build a context-manager session mock whose query().filter().first() returns obj."""
+    session = Mock()
+    session.__enter__ = Mock(return_value=session)
+    session.__exit__ = Mock(return_value=None)
+    session.query.return_value.filter.return_value.first.return_value = obj
+    return session
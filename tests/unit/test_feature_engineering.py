@@ -12,6 +12,55 @@ from app.preprocessing.feature_engineering import (
 )
 from app.validation.feature_validation import FeatureValidator
 
+# Fixed timestamp so extractor inputs are deterministic
+_NOW = datetime(2024, 1, 1, 12, 0, 0)
+
+@pytest.fixture(scope='module')
+def pipeline():
+    """Build the feature pipeline once per module; use bound_pipeline for DB access."""
+    return FeatureEngineeringPipeline(None)
+
+@pytest.fixture(scope='module')
+def rt_extractor():
+    """Real-time extractor for the static risk lookups, which never touch the database."""
+    return RealTimeFeatureExtractor(None)
+
+@pytest.fixture(scope='module')
+def validator(pipeline):
+    """Feature validator shared by the module; it keeps no per-test state."""
+    return FeatureValidator(pipeline)
+
+@pytest.fixture(scope='module')
+def df_with_nulls():
+    """Feature frame with a null value."""
+    return pd.DataFrame({
+        'transaction_id': np.array([1, 2, 3], dtype=np.int64),
+        'amount_normalized': np.array([100.0, np.nan, 200.0], dtype=np.float64),
+        'fraud_probability': np.array([0.5, 0.8, 0.3], dtype=np.float64)
+    })
+
+@pytest.fixture(scope='module')
+def df_out_of_bounds():
+    """Feature frame with probabilities outside [0, 1]."""
+    return pd.DataFrame({
+        'transaction_id': np.array([1, 2, 3], dtype=np.int64),
+        'fraud_probability': np.array([0.5, 1.5, -0.1], dtype=np.float64),  # Invalid: > 1 and < 0
+        'risk_score': np.array([0.3, 0.7, 0.9], dtype=np.float64)
+    })
+
+@pytest.fixture
+def bound_pipeline(pipeline, db_session):
+    """Module pipeline bound to this test's database session."""
+    pipeline.db_session = db_session
+    pipeline.historical_extractor.db_session = db_session
+    pipeline.realtime_extractor.db_session = db_session
+    
+    yield pipeline
+    
+    pipeline.db_session = None
+    pipeline.historical_extractor.db_session = None
+    pipeline.realtime_extractor.db_session = None
+
 class TestFeatureConfig:
     """Test FeatureConfig class."""
     
@@ -22,12 +71,13 @@ class TestFeatureConfig:
         assert hasattr(config, 'VERSION')
         assert hasattr(config, 'ALL_FEATURES')
         assert len(config.ALL_FEATURES) > 0
+        assert config.ALL_FEATURES_SET == frozenset(config.ALL_FEATURES)
         
         # Check that all feature categories are included
-        assert all(f in config.ALL_FEATURES for f in config.TRANSACTION_FEATURES)
-        assert all(f in config.ALL_FEATURES for f in config.USER_FEATURES)
-        assert all(f in config.ALL_FEATURES for f in config.DEVICE_FEATURES)
-        assert all(f in config.ALL_FEATURES for f in config.LOCATION_FEATURES)
+        assert all(f in config.ALL_FEATURES_SET for f in config.TRANSACTION_FEATURES)
+        assert all(f in config.ALL_FEATURES_SET for f in config.USER_FEATURES)
+        assert all(f in config.ALL_FEATURES_SET for f in config.DEVICE_FEATURES)
+        assert all(f in config.ALL_FEATURES_SET for f in config.LOCATION_FEATURES)
 
 class TestRealTimeFeatureExtractor:
     """Test RealTimeFeatureExtractor class."""
@@ -37,7 +87,7 @@ class TestRealTimeFeatureExtractor:
         extractor = RealTimeFeatureExtractor(db_session)
         
         transaction_data = {
-            'timestamp': datetime.utcnow(),
+            'timestamp': _NOW,
             'amount': 100.0,
             'currency': 'USD',
             'merchant_category': 'retail'
@@ -62,7 +112,7 @@ class TestRealTimeFeatureExtractor:
         features = extractor.extract_location_features(
             ip_address='192.168.1.1',
             user_id=1,
-            current_timestamp=datetime.utcnow()
+            current_timestamp=_NOW
         )
         
         expected_features = [
@@ -73,21 +123,15 @@ class TestRealTimeFeatureExtractor:
             assert feature in features
             assert isinstance(features[feature], (int, float))
     
-    def test_currency_risk_score(self, db_session):
+    @pytest.mark.parametrize('low,high', [('USD', 'BTC'), ('EUR', 'XMR')])
+    def test_currency_risk_score(self, rt_extractor, low, high):
         """Test currency risk scoring."""
-        extractor = RealTimeFeatureExtractor(db_session)
-        
-        # Test different currencies
-        assert extractor._get_currency_risk_score('USD') < extractor._get_currency_risk_score('BTC')
-        assert extractor._get_currency_risk_score('EUR') < extractor._get_currency_risk_score('XMR')
+        assert rt_extractor._get_currency_risk_score(low) < rt_extractor._get_currency_risk_score(high)
     
-    def test_merchant_risk_score(self, db_session):
+    @pytest.mark.parametrize('low,high', [('grocery', 'gambling'), ('retail', 'crypto')])
+    def test_merchant_risk_score(self, rt_extractor, low, high):
         """Test merchant category risk scoring."""
-        extractor = RealTimeFeatureExtractor(db_session)
-        
-        # Test different merchant categories
-        assert extractor._get_merchant_risk_score('grocery') < extractor._get_merchant_risk_score('gambling')
-        assert extractor._get_merchant_risk_score('retail') < extractor._get_merchant_risk_score('crypto')
+        assert rt_extractor._get_merchant_risk_score(low) < rt_extractor._get_merchant_risk_score(high)
 
 class TestHistoricalFeatureExtractor:
     """Test HistoricalFeatureExtractor class."""
@@ -98,7 +142,7 @@ class TestHistoricalFeatureExtractor:
         
         features = extractor.extract_user_features(
             sample_user.id, 
-            datetime.utcnow()
+            _NOW
         )
         
         # Should return zero values for all features
@@ -117,7 +161,7 @@ class TestHistoricalFeatureExtractor:
         extractor = HistoricalFeatureExtractor(db_session)
         
         features = extractor.extract_device_features(
-            None, datetime.utcnow()
+            None, _NOW
         )
         
         expected_features = [
@@ -135,19 +179,15 @@ class TestHistoricalFeatureExtractor:
 class TestFeatureEngineeringPipeline:
     """Test FeatureEngineeringPipeline class."""
     
-    def test_pipeline_initialization(self, db_session):
+    def test_pipeline_initialization(self, bound_pipeline):
         """Test pipeline initialization."""
-        pipeline = FeatureEngineeringPipeline(db_session)
-        
-        assert pipeline.db_session is not None
-        assert pipeline.preprocessing_pipeline is not None
-        assert pipeline.config is not None
-        assert isinstance(pipeline.config, FeatureConfig)
+        assert bound_pipeline.db_session is not None
+        assert bound_pipeline.preprocessing_pipeline is not None
+        assert bound_pipeline.config is not None
+        assert isinstance(bound_pipeline.config, FeatureConfig)
     
-    def test_extract_features_for_inference(self, db_session, sample_user):
+    def test_extract_features_for_inference(self, bound_pipeline, sample_user):
         """Test feature extraction for inference."""
-        pipeline = FeatureEngineeringPipeline(db_session)
-        
         transaction_data = {
             'id': 1,
             'user_id': sample_user.id,
@@ -156,36 +196,37 @@ class TestFeatureEngineeringPipeline:
             'merchant_category': 'retail',
             'device_id': 'test_device',
             'ip_address': '192.168.1.1',
-            'timestamp': datetime.utcnow(),
+            'timestamp': _NOW,
             'raw_payload': {}
         }
         
-        features = pipeline.extract_features_for_inference(transaction_data)
+        features = bound_pipeline.extract_features_for_inference(transaction_data)
         
         # Should return numpy array with correct shape
         assert isinstance(features, np.ndarray)
-        assert features.shape[1] == len(pipeline.config.ALL_FEATURES)
+        assert features.shape[1] == len(bound_pipeline.config.ALL_FEATURES)
     
-    def test_get_feature_schema_hash(self, db_session):
+    def test_get_feature_schema_hash(self, pipeline):
         """Test feature schema hash generation."""
-        pipeline = FeatureEngineeringPipeline(db_session)
-        
         hash1 = pipeline.get_feature_schema_hash()
         hash2 = pipeline.get_feature_schema_hash()
         
         # Hash should be consistent
         assert hash1 == hash2
         assert len(hash1) == 32  # MD5 hash length
+    
+    def test_invalidate_schema_cache(self, pipeline):
+        """Test that invalidating the schema cache recomputes the same hash."""
+        cached = pipeline.get_feature_schema_hash()
+        
+        FeatureEngineeringPipeline.invalidate_schema_cache()
+        assert FeatureEngineeringPipeline._schema_hash is None
+        
+        assert pipeline.get_feature_schema_hash() == cached
 
 class TestFeatureValidator:
     """Test FeatureValidator class."""
     
-    @pytest.fixture
-    def validator(self, db_session):
-        """Create feature validator for testing."""
-        pipeline = FeatureEngineeringPipeline(db_session)
-        return FeatureValidator(pipeline)
-    
     def test_validate_feature_ranges_valid_data(self, validator, mock_training_data):
         """Test feature range validation with valid data."""
         features_df, _ = mock_training_data
@@ -196,30 +237,16 @@ class TestFeatureValidator:
         assert len(validation_results['issues']) == 0
         assert 'feature_stats' in validation_results
     
-    def test_validate_feature_ranges_with_nulls(self, validator):
+    def test_validate_feature_ranges_with_nulls(self, validator, df_with_nulls):
         """Test feature range validation with null values."""
-        # Create data with null values
-        features_df = pd.DataFrame({
-            'transaction_id': [1, 2, 3],
-            'amount_normalized': [100.0, np.nan, 200.0],
-            'fraud_probability': [0.5, 0.8, 0.3]
-        })
-        
-        validation_results = validator.validate_feature_ranges(features_df)
+        validation_results = validator.validate_feature_ranges(df_with_nulls)
         
         assert validation_results['valid'] is False
         assert any('null values' in issue for issue in validation_results['issues'])
     
-    def test_validate_feature_ranges_out_of_bounds(self, validator):
+    def test_validate_feature_ranges_out_of_bounds(self, validator, df_out_of_bounds):
         """Test feature range validation with out-of-bounds values."""
-        # Create data with invalid probability values
-        features_df = pd.DataFrame({
-            'transaction_id': [1, 2, 3],
-            'fraud_probability': [0.5, 1.5, -0.1],  # Invalid: > 1 and < 0
-            'risk_score': [0.3, 0.7, 0.9]
-        })
-        
-        validation_results = validator.validate_feature_ranges(features_df)
+        validation_results = validator.validate_feature_ranges(df_out_of_bounds)
         
         assert validation_results['valid'] is False
         assert any('outside [0,1] range' in issue for issue in validation_results['issues'])
@@ -247,14 +274,48 @@ class TestFeatureValidator:
             assert 'min' in feature_stats
             assert 'max' in feature_stats
             assert 'percentiles' in feature_stats
+    
+    def test_generate_feature_report_correlations_with_nulls(self, validator):
+        """Test that correlations use complete rows, so a column with a null still shows up."""
+        base = np.arange(20, dtype=np.float64)
+        with_null = base * 2.0
+        with_null[3] = np.nan
+        features_df = pd.DataFrame({
+            'transaction_id': np.arange(20),
+            'feature_a': base,
+            'feature_b': with_null,
+            'feature_c': np.tile([0.0, 1.0], 10)
+        })
+        
+        report = validator.generate_feature_report(features_df)
+        
+        pairs = {(c['feature1'], c['feature2']) for c in report['correlations']['high_correlations']}
+        assert pairs == {('feature_a', 'feature_b')}
+        
+        # Correlations are computed over the complete rows only
+        complete_rows = features_df.drop(columns='transaction_id').dropna()
+        expected = np.abs(np.corrcoef(complete_rows.to_numpy().T))
+        assert report['correlations']['mean_correlation'] == pytest.approx(np.nanmean(expected))
+        assert report['correlations']['max_correlation'] == pytest.approx(np.nanmax(expected))
 
 class TestFeatureParity:
     """Test feature parity between training and inference."""
     
-    def test_feature_consistency(self, db_session, mock_training_data):
+    def test_find_inconsistent_rows_non_finite(self, validator):
+        """Test that the row mismatch mask matches np.isclose for infinities and NaNs."""
+        training = np.array([[np.inf, 1.0], [-np.inf, 1.0], [np.nan, 1.0], [np.inf, 1.0], [1.0, 1.0]])
+        inference = np.array([[np.inf, 1.0], [np.inf, 1.0], [np.nan, 1.0], [5.0, 1.0], [1.0 + 1e-9, 1.0]])
+        
+        mask = validator._find_inconsistent_rows(training, inference)
+        
+        np.testing.assert_array_equal(mask, [False, True, True, True, False])
+        np.testing.assert_array_equal(
+            mask, ~np.all(np.isclose(training, inference, atol=1e-6, rtol=1e-5), axis=1)
+        )
+    
+    def test_feature_consistency(self, bound_pipeline, mock_training_data):
         """Test that features are consistent between training and inference."""
-        pipeline = FeatureEngineeringPipeline(db_session)
-        validator = FeatureValidator(pipeline)
+        validator = FeatureValidator(bound_pipeline)
         
         # Create mock transaction data
         transaction_data = [{
@@ -265,7 +326,7 @@ class TestFeatureParity:
             'merchant_category': 'retail',
             'device_id': 'test_device',
             'ip_address': '192.168.1.1',
-            'timestamp': datetime.utcnow(),
+            'timestamp': _NOW,
             'raw_payload': {}
         }]
         
@@ -273,12 +334,9 @@ class TestFeatureParity:
         # as it requires actual database data for historical features
         # In a real scenario, you'd populate the database with test data first
     
-    def test_feature_schema_consistency(self, db_session):
+    def test_feature_schema_consistency(self, pipeline):
         """Test that feature schema is consistent."""
-        pipeline1 = FeatureEngineeringPipeline(db_session)
-        pipeline2 = FeatureEngineeringPipeline(db_session)
-        
-        hash1 = pipeline1.get_feature_schema_hash()
-        hash2 = pipeline2.get_feature_schema_hash()
+        hash1 = pipeline.get_feature_schema_hash()
+        hash2 = FeatureEngineeringPipeline(None).get_feature_schema_hash()
         
         assert hash1 == hash2
\ No newline at end of file
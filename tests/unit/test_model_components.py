@@ -6,14 +6,23 @@ import numpy as np
 import joblib
 import os
 import tempfile
-from unittest.mock import Mock, patch, MagicMock
+import threading
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import confusion_matrix
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from unittest.mock import Mock, MagicMock
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from app.training.model_trainer import ModelTrainer, ModelEvaluator
+from app.training._metrics_numba import confusion_counts
 from app.inference.fraud_detector import (
     FraudDetectionInference, ModelManager, InferenceError, ModelLoadError
 )
 
+from helpers import mock_first_query
+
 class TestModelTrainer:
     """Test ModelTrainer class."""
     
@@ -40,6 +49,8 @@ class TestModelTrainer:
             config = trainer.model_configs[model_type]
             assert 'model' in config
             assert 'params' in config
+            assert config['search_strategy'] in ('grid', 'random')
+            assert set(config['param_distributions']) <= set(config['params'])
     
     def test_calculate_metrics(self, trainer):
         """Test metrics calculation."""
@@ -62,6 +73,23 @@ class TestModelTrainer:
             assert metric in metrics
             assert isinstance(metrics[metric], (int, float))
     
+    def test_sklearnex_patched(self):
+        """Test that scikit-learn is patched when the Intel extension is installed."""
+        pytest.importorskip('sklearnex')
+        import sklearn.linear_model
+        
+        assert sklearn.linear_model.LogisticRegression.__module__.startswith(('daal4py', 'sklearnex'))
+    
+    def test_confusion_counts_matches_sklearn(self):
+        """Test that the confusion counts kernel agrees with sklearn."""
+        rng = np.random.default_rng(0)
+        y_true = rng.integers(0, 2, 1000)
+        y_score = rng.random(1000)
+        
+        expected = confusion_matrix(y_true, (y_score > 0.5).astype(int), labels=[0, 1]).ravel()
+        
+        assert confusion_counts(y_true, y_score, 0.5) == tuple(int(c) for c in expected)
+    
     def test_train_model_invalid_type(self, trainer, mock_training_data):
         """Test training with invalid model type."""
         X, y = mock_training_data
@@ -69,15 +97,15 @@ class TestModelTrainer:
         with pytest.raises(ValueError, match="Unknown model type"):
             trainer.train_model('invalid_model', X, y)
     
-    @patch('app.training.model_trainer.GridSearchCV')
-    @patch('app.training.model_trainer.cross_val_score')
-    def test_train_model_success(self, mock_cv, mock_grid, trainer, mock_training_data, db_manager):
+    def test_train_model_success(self, mocker, trainer, mock_training_data, db_manager):
         """Test successful model training."""
         X, y = mock_training_data
+        mock_grid = mocker.patch('app.training.model_trainer.GridSearchCV')
+        mock_cv = mocker.patch('app.training.model_trainer.cross_val_score')
         
-        # Mock GridSearchCV
+        # Mock GridSearchCV; probabilities follow the size of whichever split is scored
         mock_estimator = Mock()
-        mock_estimator.predict_proba.return_value = np.random.rand(len(y), 2)
+        mock_estimator.predict_proba.side_effect = lambda X: np.random.rand(len(X), 2)
         
         mock_grid_instance = Mock()
         mock_grid_instance.fit.return_value = None
@@ -91,22 +119,82 @@ class TestModelTrainer:
         mock_cv.return_value = np.array([0.8, 0.82, 0.85, 0.83, 0.81])
         
         # Mock joblib.dump
-        with patch('joblib.dump') as mock_dump, \
-             patch('builtins.open', Mock()), \
-             patch('json.dump') as mock_json_dump:
-            
-            result = trainer.train_model('logistic_regression', X, y)
-            
-            # Check result structure
-            assert 'model_version' in result
-            assert 'model_type' in result
-            assert 'metrics' in result
-            assert 'best_parameters' in result
-            assert 'training_duration' in result
-            
-            # Check that files were saved
-            assert mock_dump.called
-            assert mock_json_dump.called
+        mock_dump = mocker.patch('joblib.dump')
+        mock_json_dump = mocker.patch('json.dump')
+        
+        result = trainer.train_model('logistic_regression', X, y)
+        
+        # Check result structure
+        assert 'model_version' in result
+        assert 'model_type' in result
+        assert 'metrics' in result
+        assert 'best_parameters' in result
+        assert 'training_duration' in result
+        
+        # Check that files were saved
+        assert mock_dump.called
+        assert mock_json_dump.called
+        
+        # The model and preprocessing artifacts are both written with pickle protocol 5
+        model_dump = next(
+            c for c in mock_dump.call_args_list if c.args[1] == result['model_path']
+        )
+        assert model_dump.args[0] is mock_estimator
+        assert all(c.kwargs['protocol'] == 5 for c in mock_dump.call_args_list)
+        
+        # Search and cross-validation fan out across all cores
+        assert mock_grid.call_args.kwargs['n_jobs'] == -1
+        assert mock_cv.call_args.kwargs['n_jobs'] == -1
+        
+        # Both reuse the same precomputed stratified folds
+        cv_splits = mock_grid.call_args.kwargs['cv']
+        assert len(cv_splits) == trainer.cv_folds
+        assert all(isinstance(split, tuple) for split in cv_splits)
+        assert mock_cv.call_args.kwargs['cv'] is cv_splits
+        
+        # The test folds partition the training split exactly once
+        n_train = len(mock_grid_instance.fit.call_args.args[0])
+        test_indices = np.concatenate([test for _, test in cv_splits])
+        np.testing.assert_array_equal(np.sort(test_indices), np.arange(n_train))
+    
+    def test_dump_artifact_compressed(self, trainer, temp_artifacts_dir):
+        """Test that compressed artifacts round-trip with or without lz4 installed."""
+        trainer.compress_artifacts = True
+        path = os.path.join(temp_artifacts_dir, 'compressed.joblib')
+        
+        trainer._dump_artifact({'weights': np.arange(10)}, path)
+        
+        np.testing.assert_array_equal(joblib.load(path)['weights'], np.arange(10))
+    
+    def test_train_model_random_search(self, mocker, trainer, mock_training_data):
+        """Test that the random strategy samples from parameter distributions."""
+        X, y = mock_training_data
+        trainer.search_strategy = 'random'
+        trainer.n_iter = 5
+        
+        mock_estimator = Mock()
+        mock_estimator.predict_proba.side_effect = lambda X: np.random.rand(len(X), 2)
+        
+        mock_random = mocker.patch('app.training.model_trainer.RandomizedSearchCV')
+        mock_random.return_value.best_estimator_ = mock_estimator
+        mock_random.return_value.best_params_ = {'classifier__n_estimators': 120}
+        mock_random.return_value.best_score_ = 0.85
+        mock_grid = mocker.patch('app.training.model_trainer.GridSearchCV')
+        mocker.patch('app.training.model_trainer.cross_val_score',
+                     return_value=np.array([0.8, 0.82, 0.85, 0.83, 0.81]))
+        mocker.patch('joblib.dump')
+        mocker.patch('json.dump')
+        
+        result = trainer.train_model('random_forest', X, y)
+        
+        assert result['best_parameters'] == {'classifier__n_estimators': 120}
+        assert not mock_grid.called
+        kwargs = mock_random.call_args.kwargs
+        assert kwargs['n_iter'] == 5
+        assert kwargs['n_jobs'] == -1
+        assert set(kwargs['param_distributions']) == {
+            f'classifier__{k}' for k in trainer.model_configs['random_forest']['param_distributions']
+        }
 
 class TestModelEvaluator:
     """Test ModelEvaluator class."""
@@ -169,7 +257,7 @@ class TestModelManager:
     @pytest.fixture
     def manager(self, db_manager, temp_artifacts_dir):
         """Create model manager for testing."""
-        return ModelManager(db_manager, temp_artifacts_dir)
+        return ModelManager(db_manager, temp_artifacts_dir, artifact_cache_dir=None)
     
     def test_manager_initialization(self, manager):
         """Test model manager initialization."""
@@ -189,12 +277,11 @@ class TestModelManager:
         with pytest.raises(InferenceError, match="No model loaded"):
             manager.predict_fraud_probability(features)
     
-    @patch('os.path.exists')
-    @patch('joblib.load')
-    def test_load_active_model_success(self, mock_joblib, mock_exists, manager, sample_model_registry):
+    def test_load_active_model_success(self, mocker, manager, sample_model_registry):
         """Test successful active model loading."""
         # Mock file existence
-        mock_exists.return_value = True
+        mocker.patch('pathlib.Path.is_file', return_value=True)
+        mock_joblib = mocker.patch('joblib.load')
         
         # Mock model loading
         mock_model = Mock()
@@ -209,19 +296,200 @@ class TestModelManager:
             {'pipeline': mock_preprocessing}  # Second call for preprocessing
         ]
         
-        with patch.object(manager.db_manager, 'get_session') as mock_get_session:
-            mock_session = Mock()
-            mock_session.__enter__ = Mock(return_value=mock_session)
-            mock_session.__exit__ = Mock(return_value=None)
-            mock_session.query.return_value.filter.return_value.first.return_value = sample_model_registry
-            mock_get_session.return_value = mock_session
-            
-            result = manager.load_active_model()
-            
-            assert result is True
-            assert manager._current_model is not None
-            assert manager._current_model_version == sample_model_registry.model_version
-
+        mocker.patch.object(
+            manager.db_manager, 'get_session',
+            return_value=mock_first_query(sample_model_registry)
+        )
+        
+        result = manager.load_active_model()
+        
+        assert result is True
+        assert manager._current_model is not None
+        assert manager._current_model_version == sample_model_registry.model_version
+        
+        # Artifacts are memory-mapped rather than copied onto the heap
+        mock_joblib.assert_called_with(sample_model_registry.preprocessing_path, mmap_mode='r')
+        
+        # The active registry row is cached, so a second load skips the query
+        session = manager.db_manager.get_session.return_value
+        assert manager.load_active_model() is True
+        assert session.query.call_count == 1
+        
+        manager.invalidate_active_model_cache()
+        assert manager.load_active_model() is True
+        assert session.query.call_count == 2
+    
+    def test_load_active_model_file_lands_late(self, mocker, manager, sample_model_registry):
+        """Test that a model file missing on the first load is picked up without a refresh."""
+        manager.invalidate_active_model_cache()  # Forget files seen by earlier tests
+        is_file = mocker.patch('pathlib.Path.is_file', side_effect=[False, True, True])
+        mock_model = Mock()
+        mock_model.predict_proba.return_value = np.array([[0.7, 0.3]])
+        mock_preprocessing = Mock()
+        mock_preprocessing.feature_names_in_ = ['feature1', 'feature2']
+        mocker.patch('joblib.load', side_effect=[mock_model, {'pipeline': mock_preprocessing}])
+        mocker.patch.object(
+            manager.db_manager, 'get_session',
+            return_value=mock_first_query(sample_model_registry)
+        )
+        
+        assert manager.load_active_model() is False
+        assert manager.load_active_model() is True
+        assert manager._current_model_version == sample_model_registry.model_version
+        assert is_file.call_count == 3
+    
+    def test_load_active_model_warms(self, mocker, manager, sample_model_registry):
+        """Test that loading runs a single dummy prediction, which doubles as the warm-up."""
+        mocker.patch('pathlib.Path.is_file', return_value=True)
+        mock_model = Mock()
+        mock_model.predict_proba.return_value = np.array([[0.7, 0.3]])
+        mock_preprocessing = Mock()
+        mock_preprocessing.feature_names_in_ = ['feature1', 'feature2']
+        mocker.patch('joblib.load', side_effect=[mock_model, {'pipeline': mock_preprocessing}])
+        mocker.patch.object(
+            manager.db_manager, 'get_session',
+            return_value=mock_first_query(sample_model_registry)
+        )
+        
+        assert manager.load_active_model() is True
+        
+        mock_model.predict_proba.assert_called_once()
+        assert mock_model.predict_proba.call_args.args[0].shape == (1, 2)
+        assert manager._inference_count == 0
+    
+    def test_load_active_model_ensemble(self, mocker, manager, sample_model_registry):
+        """Test that an ensemble loads without deadlocking and is then scored on its pool."""
+        mocker.patch('pathlib.Path.is_file', return_value=True)
+        lock_held = []
+        
+        def predict_proba(features):
+            lock_held.append(manager._load_lock.locked())
+            return np.array([[0.7, 0.3]])
+        
+        members = [Mock(predict_proba=Mock(side_effect=predict_proba)) for _ in range(3)]
+        mock_preprocessing = Mock()
+        mock_preprocessing.feature_names_in_ = ['feature1', 'feature2']
+        mocker.patch('joblib.load', side_effect=[members, {'pipeline': mock_preprocessing}])
+        mocker.patch.object(
+            manager.db_manager, 'get_session',
+            return_value=mock_first_query(sample_model_registry)
+        )
+        
+        # A daemon thread, so a deadlocked load fails the test instead of hanging it
+        results = []
+        loader = threading.Thread(target=lambda: results.append(manager.load_active_model()), daemon=True)
+        loader.start()
+        loader.join(timeout=10)
+        assert results == [True]
+        
+        # Each member is probed once under the lock, then scored on the pool after release
+        assert lock_held == [True] * 3
+        fraud_probability, _ = manager.predict_fraud_probability(np.zeros((1, 2)))
+        assert fraud_probability == pytest.approx(0.3)
+        assert lock_held == [True] * 3 + [False] * 3
+    
+    def test_load_active_model_uses_artifact_cache(self, mocker, db_manager, temp_artifacts_dir,
+                                                   sample_model_registry, tmp_path):
+        """Test that a decoded model is served from the shared cache on the next load."""
+        manager = ModelManager(db_manager, temp_artifacts_dir, artifact_cache_dir=str(tmp_path))
+        model = LogisticRegression().fit(np.array([[0.0, 0.0], [1.0, 1.0]]), [0, 1])
+        mock_load = mocker.patch('app.inference.fraud_detector._load_artifact', return_value=model)
+        
+        first = manager._load_model_cached(sample_model_registry.model_version, 'model.joblib')
+        second = manager._load_model_cached(sample_model_registry.model_version, 'model.joblib')
+        
+        assert mock_load.call_count == 1
+        np.testing.assert_array_equal(first.coef_, second.coef_)
+    
+    def test_artifact_cache_requires_private_dir(self, mocker, db_manager, temp_artifacts_dir,
+                                                 tmp_path):
+        """Test that the artifact cache is created private and refused when others can write to it."""
+        private_dir = tmp_path / 'cache'
+        manager = ModelManager(db_manager, temp_artifacts_dir, artifact_cache_dir=str(private_dir))
+        
+        assert manager._artifact_cache.location == str(private_dir)
+        assert private_dir.stat().st_mode & 0o777 == 0o700
+        
+        shared_dir = tmp_path / 'shared'
+        shared_dir.mkdir()
+        shared_dir.chmod(0o777)
+        manager = ModelManager(db_manager, temp_artifacts_dir, artifact_cache_dir=str(shared_dir))
+        
+        assert manager._artifact_cache.location is None
+        
+        # A read-only artifacts volume disables the cache instead of failing startup
+        mocker.patch('os.makedirs', side_effect=PermissionError('read-only file system'))
+        manager = ModelManager(db_manager, temp_artifacts_dir, artifact_cache_dir=str(tmp_path / 'ro'))
+        
+        assert manager._artifact_cache.location is None
+    
+    def test_load_onnx_model_without_runtime(self, mocker, manager):
+        """Test that the scikit-learn artifact is used when onnxruntime is missing."""
+        mocker.patch('app.inference.fraud_detector.onnxruntime', None)
+        
+        assert manager._load_onnx_model('/models/model_v1.joblib') is None
+    
+    def test_predict_fraud_threadpool(self, mocker, manager):
+        """Test that ensemble members are scored on the thread pool and averaged."""
+        members = []
+        for p in (0.2, 0.4, 0.9):
+            member = Mock()
+            member.predict_proba.return_value = np.array([[1 - p, p]])
+            members.append(member)
+        manager._current_model = members
+        manager._pool = manager._create_pool(members)
+        
+        submit_spy = mocker.spy(ThreadPoolExecutor, 'submit')
+        
+        fraud_probability, prediction_label = manager.predict_fraud_probability(np.zeros((1, 5)))
+        
+        assert submit_spy.call_count == 3
+        assert fraud_probability == pytest.approx(0.5)
+        assert not prediction_label
+    
+    def test_load_active_model_replaces_pool(self, mocker, manager, sample_model_registry):
+        """Test that switching to a larger ensemble resizes the pool and shuts the old one down."""
+        mocker.patch('pathlib.Path.is_file', return_value=True)
+        mocker.patch('os.cpu_count', return_value=8)
+        member = Mock()
+        member.predict_proba.return_value = np.array([[0.7, 0.3]])
+        mock_preprocessing = Mock()
+        mock_preprocessing.feature_names_in_ = ['feature1', 'feature2']
+        mocker.patch('joblib.load', side_effect=[
+            [member] * 2, {'pipeline': mock_preprocessing},
+            [member] * 4, {'pipeline': mock_preprocessing}
+        ])
+        mocker.patch.object(
+            manager.db_manager, 'get_session',
+            return_value=mock_first_query(sample_model_registry)
+        )
+        
+        assert manager.load_active_model() is True
+        first_pool = manager._pool
+        assert first_pool._max_workers == 2
+        
+        manager._current_model_version = 'previous_version'
+        assert manager.load_active_model() is True
+        
+        assert manager._pool is not first_pool
+        assert manager._pool._max_workers == 4
+        with pytest.raises(RuntimeError):
+            first_pool.submit(member.predict_proba, np.zeros((1, 2)))
+    
+    def test_predict_logistic_uses_decision_function(self, mocker, manager, mock_training_data):
+        """Test that logistic regression probabilities skip the two-column predict_proba."""
+        X, y = mock_training_data
+        features = X.drop(columns='transaction_id').to_numpy()
+        model = Pipeline([('scaler', StandardScaler()), ('classifier', LogisticRegression())])
+        model.fit(features, y)
+        manager._current_model = model
+        
+        proba_spy = mocker.spy(model, 'predict_proba')
+        probabilities = manager.predict_fraud_probabilities(features[:10])
+        
+        assert not proba_spy.called
+        np.testing.assert_allclose(probabilities, model.predict_proba(features[:10])[:, 1])
+    
 class TestFraudDetectionInference:
     """Test FraudDetectionInference class."""
     
@@ -234,6 +502,7 @@ class TestFraudDetectionInference:
         """Test inference engine initialization."""
         assert inference_engine.db_manager is not None
         assert inference_engine.model_manager is not None
+        assert inference_engine.feature_pipeline is not None
         assert inference_engine.fraud_threshold == 0.5
         assert inference_engine.high_risk_threshold == 0.8
     
@@ -244,6 +513,16 @@ class TestFraudDetectionInference:
         assert inference_engine._determine_risk_level(0.7) == 'MEDIUM'
         assert inference_engine._determine_risk_level(0.3) == 'LOW'
         assert inference_engine._determine_risk_level(0.1) == 'MINIMAL'
+        
+        # Arrays are classified element-wise, with band edges inclusive
+        levels = inference_engine._determine_risk_level(np.array([0.25, 0.5, 0.8, 0.0]))
+        assert levels.tolist() == ['LOW', 'MEDIUM', 'HIGH', 'MINIMAL']
+        
+        # Non-finite probabilities are rejected rather than banded as HIGH
+        with pytest.raises(InferenceError, match="must be finite"):
+            inference_engine._determine_risk_level(np.array([0.1, np.nan]))
+        with pytest.raises(InferenceError, match="must be finite"):
+            inference_engine._determine_risk_level(float('inf'))
     
     def test_predict_fraud_not_initialized(self, inference_engine):
         """Test prediction when engine is not initialized."""
@@ -259,18 +538,18 @@ class TestFraudDetectionInference:
         with pytest.raises(InferenceError, match="not properly initialized"):
             inference_engine.predict_fraud(transaction_data)
     
-    @patch('app.preprocessing.feature_engineering.FeatureEngineeringPipeline')
-    def test_predict_fraud_feature_extraction_error(self, mock_pipeline_class, inference_engine):
+    def test_predict_fraud_feature_extraction_error(self, mocker, inference_engine):
         """Test prediction when feature extraction fails."""
         # Mock model manager as loaded
-        inference_engine.model_manager._current_model = Mock()
-        
-        # Mock feature pipeline to raise error
-        mock_pipeline = Mock()
-        mock_pipeline.extract_features_for_inference.side_effect = Exception("Feature extraction failed")
-        mock_pipeline_class.return_value = mock_pipeline
+        mock_model = Mock()
+        mock_model.predict_proba.return_value = np.array([[0.9, 0.1]])
+        inference_engine.model_manager._current_model = mock_model
         
-        inference_engine.feature_pipeline = mock_pipeline
+        # Make the shared feature pipeline's extraction fail
+        mocker.patch.object(
+            inference_engine.feature_pipeline.realtime_extractor, 'extract_transaction_features',
+            side_effect=Exception("Feature extraction failed")
+        )
         
         transaction_data = {
             'id': 1,
@@ -286,6 +565,40 @@ class TestFraudDetectionInference:
         # Should return zero vector result due to error handling
         assert 'fraud_probability' in result
         assert 'prediction_label' in result
+    
+    def test_predict_fraud_batch(self, mocker, inference_engine):
+        """Test that a batch is scored with a single predict_proba call."""
+        n_rows = 64
+        mocker.patch.object(
+            inference_engine.feature_pipeline, 'extract_features_for_inference',
+            return_value=np.zeros((1, 20))
+        )
+        
+        probabilities = np.linspace(0, 1, n_rows)
+        mock_model = Mock()
+        mock_model.predict_proba.return_value = np.column_stack([1 - probabilities, probabilities])
+        inference_engine.model_manager._current_model = mock_model
+        
+        transactions = [{'id': i, 'user_id': 1, 'amount': 100.0} for i in range(n_rows)]
+        results = inference_engine.predict_fraud_batch(transactions)
+        
+        assert mock_model.predict_proba.call_count == 1
+        assert mock_model.predict_proba.call_args.args[0].shape == (n_rows, 20)
+        assert mock_model.predict_proba.call_args.args[0].dtype == np.float32
+        assert len(results) == n_rows
+        assert results[0]['risk_level'] == 'MINIMAL'
+        assert results[-1]['risk_level'] == 'HIGH'
+        assert results[-1]['prediction_label'] is True
+        
+        # Later batches on the same thread reuse the preallocated feature buffer
+        first_batch = mock_model.predict_proba.call_args.args[0]
+        inference_engine.predict_fraud_batch(transactions[:8])
+        assert np.shares_memory(first_batch, mock_model.predict_proba.call_args.args[0])
+        
+        # A different feature width gets a freshly sized buffer instead of a misaligned one
+        inference_engine.feature_pipeline.extract_features_for_inference.return_value = np.zeros((1, 24))
+        inference_engine.predict_fraud_batch(transactions[:8])
+        assert mock_model.predict_proba.call_args.args[0].shape == (8, 24)
 
 class TestIntegration:
     """Integration tests for model training and inference."""